@@ -0,0 +1,93 @@
+# bench_chunking.py  —— golden check + throughput for chunk windowing
+#   python eval/bench_chunking.py [--golden artifacts/chunks.jsonl] [--repeat 40]
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import argparse, tempfile, time
+import regex as re
+
+from src.chunking.common import windows, normalize_space, TokenStream, TOKEN_RE
+from src.chunking.doc_chunker import chunk_doc
+from src.chunking.blog_chunker import chunk_blog
+from src.pipelines.chunk_runner import run_chunk
+
+WINDOW_CFGS = [(280, 70), (140, 20), (200, 50)]  # doc / short blog / long blog
+# TOKEN_RE is double-escaped (matches literal "\\w"/"\\S"), so on data/ every doc takes the
+# whole-body fallback. The word-level pattern below is what the windowing is sized for,
+# and is what the throughput numbers use.
+WORD_RE = re.compile(r"\w+|\S")
+TOKEN_PATTERNS = [("TOKEN_RE", TOKEN_RE), ("word", WORD_RE)]
+
+
+def legacy_windows(text, max_tokens, overlap, token_re=TOKEN_RE):
+    """The pre-TokenStream path: token list -> list-slice windows -> join -> normalize_space."""
+    return [normalize_space(" ".join(s)) for s in windows(token_re.findall(text), max_tokens, overlap)]
+
+
+def check_golden(golden: Path) -> bool:
+    """Re-chunk data/ and compare byte-for-byte with the committed chunks.jsonl."""
+    with tempfile.TemporaryDirectory() as td:
+        out = Path(td) / "chunks.jsonl"
+        run_chunk(str(ROOT), str(out))
+        new = out.read_text(encoding="utf-8").splitlines()
+    old = golden.read_text(encoding="utf-8").splitlines()
+    if new == old:
+        print(f"[golden] OK  {len(new)} chunks identical to {golden}")
+        return True
+    print(f"[golden] MISMATCH  new={len(new)} golden={len(old)}")
+    for i, (a, b) in enumerate(zip(new, old)):
+        if a != b:
+            print(f"  first diff at row {i}:\n    new: {a[:160]}\n    old: {b[:160]}")
+            break
+    return False
+
+
+def check_windows(md_files) -> bool:
+    ok = True
+    for p in md_files:
+        text = p.read_text(encoding="utf-8")
+        for name, tre in TOKEN_PATTERNS:
+            for mx, ov in WINDOW_CFGS:
+                if TokenStream(text, tre).windows(mx, ov) != legacy_windows(text, mx, ov, tre):
+                    print(f"[windows] MISMATCH {p} tokens={name} max={mx} overlap={ov}")
+                    ok = False
+    print(f"[windows] {'OK' if ok else 'FAILED'}  {len(md_files)} files x "
+          f"{len(TOKEN_PATTERNS)} token patterns x {len(WINDOW_CFGS)} configs")
+    return ok
+
+
+def bench(md_files, repeat: int):
+    big = "\n\n".join(p.read_text(encoding="utf-8") for p in md_files) * repeat
+    mb = len(big.encode("utf-8")) / 1e6
+    print(f"\n=== Windowing throughput ({mb:.1f} MB markdown, {repeat}x data/) ===")
+    for name, fn in [("tokenize only", lambda: WORD_RE.findall(big)),
+                     ("legacy", lambda: legacy_windows(big, 280, 70, WORD_RE)),
+                     ("token_stream", lambda: TokenStream(big, WORD_RE).windows(280, 70))]:
+        best = float("inf")
+        for _ in range(3):
+            t = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t)
+        print(f"{name:>14} | {best * 1000:8.1f} ms | {mb / best:6.1f} MB/s")
+
+    docs = [(p, p.read_text(encoding="utf-8")) for p in md_files]
+    t = time.perf_counter()
+    n = 0
+    for _ in range(repeat):
+        for p, md in docs:
+            chunker = chunk_blog if "blogs" in p.parts else chunk_doc
+            n += sum(1 for _ in chunker(md, str(p.relative_to(ROOT))))
+    dt = time.perf_counter() - t
+    print(f"{'chunk_doc/blog':>14} | {dt * 1000:8.1f} ms | {n / dt:8.0f} chunks/s")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--golden", default=str(ROOT / "artifacts/chunks.jsonl"))
+    ap.add_argument("--repeat", type=int, default=40)
+    args = ap.parse_args()
+
+    md_files = sorted((ROOT / "data").rglob("*.md"))
+    ok = check_golden(Path(args.golden)) & check_windows(md_files)
+    bench(md_files, args.repeat)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,38 @@
+# bench_claims.py  —— rule-based claim extraction: us/chunk, coverage, and LLM calls it avoids
+#   python eval/bench_claims.py [--chunks artifacts/chunks.jsonl] [--repeat 20]
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import argparse
+import json
+import time
+from collections import Counter
+
+from src.graphrag.extract_rules import extract_claims_rules, looks_config_like
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", default=str(ROOT / "artifacts/chunks.jsonl"))
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    with open(args.chunks, encoding="utf-8") as f:
+        texts = [json.loads(l)["text"] for l in f if l.strip()]
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for t in texts:
+            extract_claims_rules(t)
+    us = (time.perf_counter() - t0) / (args.repeat * len(texts)) * 1e6
+
+    claims = [extract_claims_rules(t) for t in texts]
+    misses = [t for t, c in zip(texts, claims) if not c]
+    gated = sum(looks_config_like(t) for t in misses)
+    keys = Counter(c["key"] for cs in claims for c in cs)
+
+    print(f"{len(texts)} chunks | {us:.0f} us/chunk | {sum(map(len, claims))} claims")
+    print(f"rule hits={len(texts) - len(misses)} | misses={len(misses)} | LLM calls={gated} "
+          f"| LLM calls avoided={len(texts) - gated} ({(len(texts) - gated) / max(1, len(texts)):.0%})")
+    for k, n in keys.most_common():
+        print(f"  {k:<32} {n}")
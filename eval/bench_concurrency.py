@@ -0,0 +1,157 @@
+# bench_concurrency.py  —— QueryService under concurrent callers: isolation, single-flight, admission control
+#   python eval/bench_concurrency.py [--clients 16] [--requests 400] [--workers 4] [--max-queue 8] [--distinct 12]
+# Synthetic per-source retrievers (no embedding model) that return the same index-owned node objects on
+# every call, a fake "cross-encoder" that rewrites scores and writes retrieval_score metadata (as the real
+# rerankers do), and the real fusion + QueryPipeline. Client threads send case/whitespace variants of
+# --distinct queries; every result is compared against a serial run, and the index-owned nodes are
+# checked for leaked writes. A final burst of distinct queries shows the Overloaded rejections.
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import argparse
+import random
+import threading
+import time
+import zlib
+from typing import List, Optional
+
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.settings import Settings
+
+from src.cache.query_cache import normalize_query
+from src.fusion.query_fusion import build_fusion_engine
+from src.fusion.utils import BiasedRetriever
+from src.pipelines.query_pipeline import QueryPipeline
+from src.pipelines.query_service import Overloaded, QueryService
+
+SOURCES = ("docs", "forums", "blogs")
+
+
+def h(*parts) -> float:
+    return zlib.crc32("|".join(map(str, parts)).encode("utf-8")) / 2**32
+
+
+class FakeRetriever:
+    """Scores depend on (normalized query, node); the node objects are the index's own, shared by every query."""
+
+    def __init__(self, name, n, search_ms):
+        self.search_ms = search_ms
+        self.nodes = [TextNode(text=f"{name} chunk {i}", id_=f"{name}-{i}", metadata={"source": name, "id": f"{name}-{i}"})
+                      for i in range(n)]
+
+    def retrieve(self, qb):
+        time.sleep(self.search_ms / 1000)
+        q = normalize_query(qb.query_str)
+        hits = [NodeWithScore(node=n, score=h(q, n.node_id)) for n in self.nodes]
+        return sorted(hits, key=lambda x: -x.score)[:10]
+
+
+class FakeRerank(BaseNodePostprocessor):
+    """Writes like SentenceTransformerRerank: metadata["retrieval_score"] and a new score."""
+    ms: float = 5.0
+    top_n: int = 8
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeRerank"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        time.sleep(self.ms / 1000)
+        q = normalize_query(query_bundle.query_str)
+        for n in nodes:
+            n.node.metadata["retrieval_score"] = n.score
+            n.score = h("ce", q, n.node.node_id)
+        return sorted(nodes, key=lambda x: -x.score)[:self.top_n]
+
+
+def signature(res):
+    return [(n.node.node_id, round(n.score, 9), round(n.node.metadata["retrieval_score"], 9)) for n in res.ranked]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=400, help="Total requests over all clients")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--max-queue", type=int, default=8)
+    ap.add_argument("--distinct", type=int, default=12, help="Distinct queries the clients draw from")
+    ap.add_argument("--search-ms", type=float, default=2.0, help="Simulated per-source search time")
+    ap.add_argument("--rerank-ms", type=float, default=5.0, help="Simulated cross-encoder time")
+    args = ap.parse_args()
+
+    Settings.llm = None
+    embed = MockEmbedding(embed_dim=8)
+    index = {s: FakeRetriever(s, 50, args.search_ms) for s in SOURCES}
+    engine = build_fusion_engine([BiasedRetriever(index[s], name=s) for s in SOURCES], per_source_top_k=10,
+                                 reranker=FakeRerank(ms=args.rerank_ms))
+    pipe = QueryPipeline.from_engine(engine)
+    queries = [f"query number {i} about retries" for i in range(args.distinct)]
+
+    with QueryService(pipe, workers=1, max_queue=args.distinct, embed_model=embed) as serial:
+        ref = {q: signature(serial.query(q)) for q in queries}
+
+    svc = QueryService(pipe, workers=args.workers, max_queue=args.max_queue, embed_model=embed)
+    lock = threading.Lock()
+    lat, wrong, rejected, coalesced = [], 0, 0, 0
+    per_client = args.requests // args.clients
+
+    def client(seed):
+        global wrong, rejected, coalesced
+        rnd = random.Random(seed)
+        for _ in range(per_client):
+            q = rnd.choice(queries)
+            variant = rnd.choice([q, q.upper(), f"  {q}?", q.replace(" ", "  ")])
+            t0 = time.perf_counter()
+            try:
+                res = svc.query(variant)
+            except Overloaded:
+                with lock:
+                    rejected += 1
+                time.sleep(0.005)  # back off, then move on
+                continue
+            ms = (time.perf_counter() - t0) * 1000
+            sig = signature(res)
+            # Mutate what we got, as a caller might; nobody else may see it
+            for n in res.ranked:
+                n.score = -1.0
+                n.node.metadata["touched"] = seed
+            with lock:
+                lat.append(ms)
+                coalesced += res.coalesced
+                wrong += sig != ref[q]
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    secs = time.perf_counter() - t0
+    m = svc.metrics()
+    leaked = sum(1 for r in index.values() for n in r.nodes if set(n.metadata) != {"source", "id"})
+
+    lat.sort()
+    print(f"{len(lat)} answered / {args.clients * per_client} sent in {secs:.2f}s "
+          f"({len(lat) / secs:.0f} q/s), {args.workers} workers, max_queue={args.max_queue}")
+    print(f"latency ms: p50={lat[len(lat) // 2]:.1f} p99={lat[int(len(lat) * 0.99) - 1]:.1f}")
+    print(f"computed={m['completed']} coalesced={m['coalesced']} rejected={m['rejected']} "
+          f"peak_queued={m['peak_queued']} queue_ms p50={m['queue_ms_p50']} p99={m['queue_ms_p99']}")
+    print(f"results differing from the serial run: {wrong}; writes leaked into index-owned nodes: {leaked}")
+
+    # Burst of distinct queries at once: admission control rejects what neither a worker nor the queue can take
+    burst = [f"burst query {i}" for i in range(args.workers + args.max_queue + 10)]
+    futs, over = [], 0
+    for q in burst:
+        try:
+            futs.append(svc.submit(q))
+        except Overloaded:
+            over += 1
+    for f in futs:
+        f.result()
+    print(f"burst of {len(burst)} distinct queries: {len(futs)} admitted, {over} rejected with Overloaded")
+    svc.close()
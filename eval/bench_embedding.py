@@ -0,0 +1,37 @@
+# bench_embedding.py  —— chunks/sec of the multi-process embedding pool vs worker count
+#   python eval/bench_embedding.py [--chunks artifacts/chunks.jsonl] [--repeat 20] [--workers 1 2 4 8]
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import argparse
+
+from src.fusion.utils import iter_chunk_rows
+from src.embedding.pool import EmbeddingPool, physical_cores
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", default=str(ROOT / "artifacts/chunks.jsonl"))
+    ap.add_argument("--model", default="intfloat/e5-small-v2")
+    ap.add_argument("--repeat", type=int, default=20, help="Replicate the corpus to get a stable timing")
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=1, help="torch threads per worker")
+    ap.add_argument("--workers", type=int, nargs="*", default=None)
+    args = ap.parse_args()
+
+    texts = [r["text"] for r in iter_chunk_rows(args.chunks)] * args.repeat
+    cores = physical_cores()
+    counts = args.workers or sorted({1, 2, 4, 8, 16, 32, cores} & set(range(1, cores + 1)))
+    print(f"{len(texts)} texts, {cores} physical cores")
+
+    base = None
+    print("\n=== Embedding pool scaling ===")
+    for w in counts:
+        with EmbeddingPool(args.model, workers=w, batch_size=args.batch_size, torch_threads=args.threads) as pool:
+            pool.embed_texts(texts[: w * args.batch_size])  # warm-up: model load in every worker
+            pool.embedded, pool.seconds = 0, 0.0
+            pool.embed_texts(texts)
+            cps = pool.chunks_per_sec
+        base = base or cps
+        print(f"workers={w:>3} | {cps:9.1f} chunks/s | speedup={cps / base:5.2f}x | efficiency={cps / base / w:4.0%}")
@@ -0,0 +1,68 @@
+# bench_rerank.py  —— cross-encoder rerank latency: per-call tokenization vs pre-tokenized passages
+#   python eval/bench_rerank.py [--chunks artifacts/chunks.jsonl] [--candidates 30] [--queries eval/queries.jsonl]
+# Both rerankers score the same candidates for every query (first --candidates chunks per query by
+# a cheap lexical overlap, so no index build is needed); prints ms/query and the max score difference.
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import argparse
+import json
+import time
+
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from src.fusion.utils import iter_chunk_rows, row_to_document
+from src.rerank.cross_encoder import build_reranker
+from src.rerank.pretokenized import PassageTokenCache
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", default=str(ROOT / "artifacts/chunks.jsonl"))
+    ap.add_argument("--queries", default=str(ROOT / "eval/queries.jsonl"))
+    ap.add_argument("--model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    ap.add_argument("--candidates", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    docs = [row_to_document(r) for r in iter_chunk_rows(args.chunks)]
+    qs = [json.loads(l)["q"] for l in Path(args.queries).read_text(encoding="utf-8").splitlines() if l.strip()]
+
+    def candidates(q):
+        words = set(q.lower().split())
+        ranked = sorted(docs, key=lambda d: -len(words & set(d.text.lower().split())))
+        return [NodeWithScore(node=d.model_copy(), score=1.0) for d in ranked[:args.candidates]]
+
+    plain = build_reranker(model=args.model, top_n=args.candidates)
+    pretok = build_reranker(model=args.model, top_n=args.candidates, pretokenized=True)
+    t0 = time.perf_counter()
+    pretok.set_cache(PassageTokenCache.build(
+        ((d.metadata["id"], d.get_content(metadata_mode=MetadataMode.EMBED)) for d in docs),
+        pretok.tokenizer, model=args.model))
+    print(f"{len(docs)} chunks pre-tokenized in {time.perf_counter() - t0:.2f}s, "
+          f"{len(qs)} queries x {args.candidates} candidates")
+
+    cands = {q: candidates(q) for q in qs}
+    for r in (plain, pretok):
+        r.postprocess_nodes(cands[qs[0]], query_bundle=QueryBundle(qs[0]))  # warm-up
+
+    timings, diff = {}, 0.0
+    for name, r in (("per-call tokenize", plain), ("pre-tokenized", pretok)):
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for q in qs:
+                r.postprocess_nodes([NodeWithScore(node=n.node.model_copy(), score=n.score) for n in cands[q]],
+                                    query_bundle=QueryBundle(q))
+        timings[name] = (time.perf_counter() - t0) * 1000 / (args.repeat * len(qs))
+    for q in qs:
+        a = {n.node.metadata["id"]: n.score for n in plain.postprocess_nodes(
+            [NodeWithScore(node=n.node.model_copy(), score=n.score) for n in cands[q]], query_bundle=QueryBundle(q))}
+        b = {n.node.metadata["id"]: n.score for n in pretok.postprocess_nodes(
+            [NodeWithScore(node=n.node.model_copy(), score=n.score) for n in cands[q]], query_bundle=QueryBundle(q))}
+        diff = max([diff] + [abs(float(a[k]) - float(b[k])) for k in a.keys() & b.keys()])
+
+    base = timings["per-call tokenize"]
+    for name, ms in timings.items():
+        print(f"{name:>18} | {ms:8.2f} ms/query | speedup={base / ms:5.2f}x")
+    print(f"max |score difference| = {diff:.2e}")
@@ -0,0 +1,88 @@
+# bench_shards.py  —— queries/sec of sharded scatter-gather retrieval vs shard count
+#   python eval/bench_shards.py [--n 200000] [--dim 384] [--queries 200] [--shards 1 2 4 8] [--clients 4]
+# Synthetic unit vectors split over the three sources (no embedding model needed), so the
+# timing is the per-query scan + scatter/gather + merge. Every shard count is checked against
+# an exact in-process top-k over the full matrix. --clients N also times N threads searching at once.
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from src.embedding.pool import physical_cores
+from src.fusion.sharded import ShardedIndex, _normalize
+
+SOURCES = ("docs", "forums", "blogs")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200_000, help="Synthetic chunk vectors")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=30)
+    ap.add_argument("--shards", type=int, nargs="*", default=None)
+    ap.add_argument("--clients", type=int, default=1, help="Threads issuing queries concurrently")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vecs = _normalize(rng.standard_normal((args.n, args.dim), dtype=np.float32))
+    srcs = rng.integers(0, len(SOURCES), args.n)
+    ids = [f"chunk-{i}" for i in range(args.n)]
+    queries = _normalize(rng.standard_normal((args.queries, args.dim), dtype=np.float32))
+    cores = physical_cores()
+    counts = args.shards or sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    print(f"{args.n} vectors x {args.dim}, {args.queries} queries, top_k={args.top_k}, {cores} physical cores")
+
+    # Exact reference (single process, whole matrix per source)
+    t0 = time.perf_counter()
+    ref = []
+    for q in queries:
+        hit = {}
+        for si, s in enumerate(SOURCES):
+            sel = np.flatnonzero(srcs == si)
+            sims = vecs[sel] @ q
+            hit[s] = {ids[sel[i]] for i in np.argsort(-sims)[:args.top_k]}
+        ref.append(hit)
+    print(f"in-process reference: {args.queries / (time.perf_counter() - t0):8.1f} q/s (incl. per-query source masks)")
+
+    base = None
+    print("\n=== Sharded scatter-gather scaling ===")
+    for n in counts:
+        with ShardedIndex(n) as index:
+            for si, s in enumerate(SOURCES):
+                sel = np.flatnonzero(srcs == si)
+                for a in range(0, len(sel), 50_000):
+                    part = sel[a:a + 50_000]
+                    index.add(s, vecs[part], [ids[i] for i in part])
+            index.search(queries[0], args.top_k, SOURCES)  # warm-up: fold pending batches in every shard
+            t0 = time.perf_counter()
+            results = [index.search(q, args.top_k, SOURCES) for q in queries]
+            qps = args.queries / (time.perf_counter() - t0)
+            cqps = None
+            if args.clients > 1:
+                par = [None] * len(queries)
+
+                def client(c):
+                    for j in range(c, len(queries), args.clients):
+                        par[j] = index.search(queries[j], args.top_k, SOURCES)
+
+                threads = [threading.Thread(target=client, args=(c,)) for c in range(args.clients)]
+                t0 = time.perf_counter()
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                cqps = args.queries / (time.perf_counter() - t0)
+                results += par
+                queries_ref = ref + ref
+            else:
+                queries_ref = ref
+        exact = all({p for _, p in res[s]} == ref_q[s] for res, ref_q in zip(results, queries_ref) for s in SOURCES)
+        base = base or qps
+        print(f"shards={n:>3} | {qps:8.1f} q/s | speedup={qps / base:5.2f}x | efficiency={qps / base / n:4.0%} "
+              + (f"| {args.clients} clients: {cqps:8.1f} q/s " if cqps is not None else "") + f"| exact={exact}")
@@ -1,16 +1,22 @@
-# eval_quick.py  —— no latency version
+# eval_quick.py  —— Hits@1 / Recall@5 per config, with per-query latency (index build excluded)
 from pathlib import Path
 import sys
 ROOT = Path(__file__).resolve().parents[1]  # project_root
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
-import json, math
+import json, math, time
 from llama_index.core.settings import Settings
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
-from src.fusion.utils import load_rows_from_jsonl, partition_rows_by_source
-from src.fusion.build_retrievers import build_all_retrievers
+from src.fusion.utils import artifact_version, load_chunks, partition_rows_by_source
+from src.fusion.build_retrievers import build_all_retrievers, add_lexical
 from src.fusion.query_fusion import build_fusion_engine
+from src.cache.query_cache import nodes_to_payload
+from src.cache.semantic_cache import SemanticCache
+from src.fusion.adaptive_k import AdaptiveK
+from src.telemetry.stats import collect_stats
+from src.telemetry.memory import enable_mem_profile, mem_profiler, mem_stage
+from src.store.bm25_index import BM25Index, bm25_path, load_or_build_bm25
 
 
 def hits1(ranked_ids, gold):
@@ -20,16 +26,35 @@ def recall_at5(ranked_ids, gold):
     top5 = set(ranked_ids[:5])
     return 1.0 if top5 & gold else 0.0
 
-def run_once(chunks_path, q, per_source_topk, use_rerank, rerank_topn=12):
+def run_once(chunks_path, q, per_source_topk, use_rerank, rerank_topn=12, semantic_cache=None, adaptive=None,
+             lexical=None):
+    """
+    Returns (ranked_ids, semantic_hit, n_candidates, query_ms) — n_candidates = summed per-source k
+    (None on a cache hit); query_ms = retrieval + fusion + rerank, without the index build.
+    lexical: {"mode": "fuse"|"prefilter", "top_m": M} adds the BM25 index (see src/fusion/lexical.py).
+    """
     from llama_index.core.query_engine import RetrieverQueryEngine  # ← 新增
+    from llama_index.core.schema import QueryBundle
 
     # 初始化（与 main.py 一致）
     Settings.llm = None
     Settings.embed_model = HuggingFaceEmbedding(model_name="intfloat/e5-small-v2")
 
-    rows = load_rows_from_jsonl(chunks_path)
+    qb = QueryBundle(query_str=q)
+    if semantic_cache is not None:
+        qb.embedding = Settings.embed_model.get_query_embedding(q)
+        pkey = SemanticCache.params_key(per_source_topk=per_source_topk, rerank=use_rerank, rerank_topn=rerank_topn)
+        hit = semantic_cache.lookup(qb.embedding, pkey)
+        if hit is not None:
+            # Paraphrase of an earlier query: no index build, retrieval or cross-encoder
+            return [p["metadata"].get("id") for p in hit.value["nodes"]], True, None, 0.0
+
+    rows = load_chunks(chunks_path)
     d, f, b = partition_rows_by_source(rows)
     retrievers = build_all_retrievers(d, f, b, top_k=30)  # vec-topk 固定30
+    if lexical:
+        retrievers = add_lexical(retrievers, BM25Index(bm25_path(chunks_path)), mode=lexical["mode"],
+                                 top_k=30, top_m=lexical.get("top_m", 200))
 
     reranker = None
     if use_rerank:
@@ -37,7 +62,7 @@ def run_once(chunks_path, q, per_source_topk, use_rerank, rerank_topn=12):
         reranker = build_reranker(top_n=rerank_topn)
 
     base_engine = build_fusion_engine(
-        retrievers, per_source_top_k=per_source_topk, reranker=reranker
+        retrievers, per_source_top_k=per_source_topk, reranker=reranker, adaptive=adaptive
     )
 
     engine = RetrieverQueryEngine.from_args(
@@ -46,23 +71,41 @@ def run_once(chunks_path, q, per_source_topk, use_rerank, rerank_topn=12):
         response_mode="no_text",
     )
 
-    resp = engine.query(q)
+    with collect_stats() as st, mem_stage("query"):
+        t0 = time.perf_counter()
+        resp = engine.query(qb)
+        query_ms = (time.perf_counter() - t0) * 1000
+    if semantic_cache is not None:
+        semantic_cache.add(qb.embedding, pkey, q, {"nodes": nodes_to_payload(resp.source_nodes)})
     ranked_ids = [(sn.metadata or {}).get("id") for sn in resp.source_nodes]
-    return ranked_ids
+    return ranked_ids, False, sum(st.get("k_per_source", {}).values()), query_ms
 
 def evaluate(chunks_path, queries_path, configs):
     qs = [json.loads(l) for l in Path(queries_path).read_text(encoding="utf-8").splitlines()]
+    if any(cfg.get("lexical") for cfg in configs):
+        load_or_build_bm25(chunks_path, artifact_version(chunks_path))  # rebuilt unless built from this artifact
     rows = []
     for cfg in configs:
-        h1, r5 = [], []
-        for ex in qs:
-            ranked = run_once(
+        h1, r5, ncand, lat = [], [], [], []
+        sem = None
+        if cfg.get("semantic_threshold") is not None:
+            sem = SemanticCache(threshold=cfg["semantic_threshold"])
+        # "paraphrases" configs also replay each query's paraphrases (same gold ids)
+        runs = [(q, ex) for ex in qs for q in [ex["q"]] + (ex.get("paraphrases", []) if cfg.get("paraphrases") else [])]
+        for q, ex in runs:
+            ranked, _, n, ms = run_once(
                 chunks_path,
-                ex["q"],
+                q,
                 cfg["per_source_topk"],
                 cfg["rerank"],
                 cfg.get("rerank_topn", 12),
+                semantic_cache=sem,
+                adaptive=AdaptiveK(**cfg["adaptive"]) if cfg.get("adaptive") else None,
+                lexical=cfg.get("lexical"),
             )
+            if n is not None:
+                ncand.append(n)
+                lat.append(ms)
             gold = set(ex["relevant_ids"])
             h1.append(hits1(ranked, gold))
             r5.append(recall_at5(ranked, gold))
@@ -73,19 +116,52 @@ def evaluate(chunks_path, queries_path, configs):
             "rerank_topn": cfg.get("rerank_topn", 12),
             "Hits@1": sum(h1) / len(h1),
             "Recall@5": sum(r5) / len(r5),
+            "sem_hit_rate": sem.hit_rate if sem else None,
+            "avg_candidates": sum(ncand) / len(ncand) if ncand else None,
+            "query_ms": sum(lat) / len(lat) if lat else None,
         })
     return rows
 
 if __name__ == "__main__":
+    # --mem-profile: per-stage peak RSS / heap (index build, query, rerank) after the table
+    if "--mem-profile" in sys.argv[1:]:
+        enable_mem_profile()
     cfgs = [
         {"name": "A_base_k20",     "per_source_topk": 20, "rerank": False},
         {"name": "A_base_k30",     "per_source_topk": 30, "rerank": False},
         {"name": "B_ce_k20_t12",   "per_source_topk": 20, "rerank": True,  "rerank_topn": 12},
         {"name": "B_ce_k30_t12",   "per_source_topk": 30, "rerank": True,  "rerank_topn": 12},
+        # Paraphrase traffic: C_para is the no-cache reference for the semantic-cache rows
+        {"name": "C_para_k30_t12",  "per_source_topk": 30, "rerank": True,  "rerank_topn": 12, "paraphrases": True},
+        {"name": "C_sem95_k30_t12", "per_source_topk": 30, "rerank": True,  "rerank_topn": 12, "paraphrases": True,
+         "semantic_threshold": 0.95},
+        {"name": "C_sem92_k30_t12", "per_source_topk": 30, "rerank": True,  "rerank_topn": 12, "paraphrases": True,
+         "semantic_threshold": 0.92},
+        # Adaptive per-source k (vec-topk 30 is the ceiling); avg_candidates is the fusion/rerank load
+        {"name": "D_rel90_t12",    "per_source_topk": 30, "rerank": True,  "rerank_topn": 12,
+         "adaptive": {"rel": 0.9, "gap": None}},
+        {"name": "D_gap3_t12",     "per_source_topk": 30, "rerank": True,  "rerank_topn": 12,
+         "adaptive": {"rel": None, "gap": 3.0}},
+        {"name": "D_both_cap40_t12", "per_source_topk": 30, "rerank": True,  "rerank_topn": 12,
+         "adaptive": {"rel": 0.9, "gap": 3.0, "max_total": 40}},
+        # BM25: as a fourth fused retriever, or as the candidate generator for dense scoring (+ rerank)
+        {"name": "E_bm25_k30",     "per_source_topk": 30, "rerank": False, "lexical": {"mode": "fuse"}},
+        {"name": "E_bm25_k30_t12", "per_source_topk": 30, "rerank": True,  "rerank_topn": 12,
+         "lexical": {"mode": "fuse"}},
+        {"name": "E_pre50_k30_t12", "per_source_topk": 30, "rerank": True,  "rerank_topn": 12,
+         "lexical": {"mode": "prefilter", "top_m": 50}},
+        {"name": "E_pre20_k30_t12", "per_source_topk": 30, "rerank": True,  "rerank_topn": 12,
+         "lexical": {"mode": "prefilter", "top_m": 20}},
     ]
     out = evaluate("artifacts/chunks.jsonl", "eval/queries.jsonl", cfgs)
-    print("\n=== Quick Eval (Hits@1 / Recall@5) ===")
+    print("\n=== Quick Eval (Hits@1 / Recall@5, query latency without index build) ===")
     for r in out:
         print(f"{r['name']:>12} | topk={r['per_source_topk']:>2} "
               f"| rerank={'Y' if r['rerank'] else 'N'} "
-              f"| Hits@1={r['Hits@1']:.2f} | R@5={r['Recall@5']:.2f}")
+              f"| Hits@1={r['Hits@1']:.2f} | R@5={r['Recall@5']:.2f}"
+              + (f" | sem_hit={r['sem_hit_rate']:.2f}" if r["sem_hit_rate"] is not None else "")
+              + (f" | cands={r['avg_candidates']:.1f}" if r["avg_candidates"] is not None else "")
+              + (f" | {r['query_ms']:.1f} ms/q" if r["query_ms"] is not None else ""))
+    if mem_profiler() is not None:
+        print("\n=== Memory per stage ===")
+        print(mem_profiler().report())
@@ -0,0 +1,85 @@
+# stub_openai_server.py  —— local OpenAI-compatible /v1/chat/completions for testing --answer --stream
+#   python eval/stub_openai_server.py [--port 8011] [--first-token-ms 300] [--token-ms 30]
+#   OPENAI_API_KEY=stub python main.py fusion --q "..." --answer --stream --llm-api-base http://127.0.0.1:8011/v1
+# Answers with a fixed sentence that names the first cited chunk, word by word, after a configurable
+# "prefill" delay, so TTFT and total synthesis time in the --log-jsonl record are predictable.
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ARGS = None
+
+
+def _answer(messages):
+    prompt = " ".join(str(m.get("content", "")) for m in messages)
+    m = re.search(r"^id: (\S+)", prompt, re.M)
+    cited = m.group(1) if m else "the provided context"
+    return f"Stub answer based on {cited}. Set the value shown in the cited chunk and retry."
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, code, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        words = _answer(req.get("messages", [])).split(" ")
+        model = req.get("model", "stub")
+        created = int(time.time())
+        time.sleep(ARGS.first_token_ms / 1000)
+        if not req.get("stream"):
+            time.sleep(ARGS.token_ms * (len(words) - 1) / 1000)
+            return self._send_json(200, {
+                "id": "stub-1", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(delta, finish=None):
+            chunk = {"id": "stub-1", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for i, w in enumerate(words):
+            if i:
+                time.sleep(ARGS.token_ms / 1000)
+            event({"content": w if i == 0 else " " + w})
+        event({}, finish="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8011)
+    ap.add_argument("--first-token-ms", type=float, default=300.0, help="Delay before the first token")
+    ap.add_argument("--token-ms", type=float, default=30.0, help="Delay between tokens")
+    ARGS = ap.parse_args()
+    srv = ThreadingHTTPServer((ARGS.host, ARGS.port), Handler)
+    print(f"stub OpenAI server on http://{ARGS.host}:{ARGS.port}/v1")
+    srv.serve_forever()
@@ -1,35 +1,52 @@
 # main.py  —— unify to step 3 of "pure vector + simple RRF fusion"
 import argparse
+import atexit
 import sys
 from pathlib import Path
-from datetime import datetime
 import os
+import time
+import contextvars
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 # Make "src" importable
 sys.path.append(str(Path(__file__).parent / "src"))
 
 from src.pipelines.chunk_runner import run_chunk
-from src.fusion.utils import (
-    load_rows_from_jsonl,
-    partition_rows_by_source,
-)
-from src.fusion.build_retrievers import build_all_retrievers
-from src.fusion.query_fusion import build_fusion_engine
+from src.fusion.utils import iter_chunk_rows, artifact_version
+from src.fusion.build_retrievers import build_all_retrievers_streaming, build_sharded_retrievers, add_lexical
+from src.fusion.query_fusion import build_fusion_engine, TracedPostprocessor
+from src.fusion.snapshot import IndexSnapshot, SnapshotManager, SnapshotRetriever, current_snapshot
+from src.store.bm25_index import BM25Index, bm25_path, load_or_build_bm25
+from src.store.chunk_store import ChunkStore
+from src.synthesis.context_packer import ContextPacker
+from src.pipelines.query_pipeline import QueryPipeline
 from llama_index.core.settings import Settings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from src.telemetry.tracing import span, start_trace, current_trace, export_otel_json
+from src.telemetry.querylog import QueryLogger, build_query_record
+from src.telemetry.stats import collect_stats, record
+from src.telemetry.memory import MemoryBudget, enable_mem_profile, mem_profiler, mem_stage
+from src.fusion.adaptive_k import AdaptiveK
+from src.cache.query_cache import QueryCache, nodes_to_payload, payload_to_nodes
+from src.cache.semantic_cache import SemanticCache
+from llama_index.core.schema import QueryBundle
+from llama_index.core.base.response.schema import Response, StreamingResponse
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-def run_graphrag_on_response(response_obj, topn: int = 10, query: str =""):
-    """Pass the ask() response object in, run GraphRAG contradiction check on top-N results, and print."""
+def run_graphrag_on_nodes(nodes, topn: int = 10, query: str ="") -> List[str]:
+    """Pass the ranked nodes from ask() in, run GraphRAG contradiction check on top-N results.
+    Returns the report lines instead of printing, so it can run next to answer synthesis."""
     from src.graphrag.graph import ClaimGraph
     G = ClaimGraph()
+    lines: List[str] = []
 
-    top_nodes = (getattr(response_obj, "source_nodes", None) or [])[:topn]
+    top_nodes = list(nodes or [])[:topn]
     if not top_nodes:
-        print("[GraphRAG] no nodes to build graph on")
-        return
+        lines.append("[GraphRAG] no nodes to build graph on")
+        return lines
 
-    G.build_from_nodes(top_nodes)
+    with mem_stage("graph_build"):
+        G.build_from_nodes(top_nodes)
     q = (query or "").lower()
     # List the keys you care about (add/remove as needed)
     keys = []
@@ -51,109 +68,305 @@ def run_graphrag_on_response(response_obj, topn: int = 10, query: str =""):
         keys.append("param.metrics.granularity")
     keys = list(dict.fromkeys(keys))  # deduplicate
     if not keys:
-        print("[GraphRAG] no relevant keys inferred from query; skip")
-        return
+        lines.append("[GraphRAG] no relevant keys inferred from query; skip")
+        return lines
 
-    print("\n=== CONTRADICTION CHECK IF ANY (GraphRAG) ===")
+    lines.append("\n=== CONTRADICTION CHECK IF ANY (GraphRAG) ===")
     found_any = False
     for k in keys:
         decisions = G.decide_by_key(k, top_k=2, lam=0.7)
         if not decisions:
             continue
         found_any = True
-        print(f"\nKey: {k}")
+        lines.append(f"\nKey: {k}")
         for d in decisions:
-            print(f"  - claim: {d['key']}={d['val']}  consensus={d['consensus']:.4f}")
+            lines.append(f"  - claim: {d['key']}={d['val']}  consensus={d['consensus']:.4f}")
             for s in d["supports"][:2]:
-                print(f"      support: {s['source']}:{s['id']}  w={s['weight']:.3f}")
+                lines.append(f"      support: {s['source']}:{s['id']}  w={s['weight']:.3f}")
             for c in d["contradicts"][:2]:
-                print(f"      contradict: {c['source']}:{c['id']}  w={c['weight']:.3f}  via {c['claim']}")
+                lines.append(f"      contradict: {c['source']}:{c['id']}  w={c['weight']:.3f}  via {c['claim']}")
     if not found_any:
-        print("[GraphRAG] no target keys found in top results")
+        lines.append("[GraphRAG] no target keys found in top results")
+    record(graph_keys=keys, graph_decisions=sum(l.startswith("  - claim:") for l in lines))
+    return lines
 
 def require_openai_key():
     key = os.getenv("OPENAI_API_KEY")
     if not key:
         raise RuntimeError("OPENAI_API_KEY not set. Run: export OPENAI_API_KEY=sk-xxxx")
     return key
-def ask(engine, query: str, *, graph: bool = False, graph_topn: int = 10, log_txt: str=None, flags:dict=None):
+def ask(engine: QueryPipeline, query: str, *, graph: bool = False, graph_topn: int = 10, logger: QueryLogger=None, flags:dict=None,
+        cache: QueryCache=None, cache_key: str=None, cached: dict=None, semantic_cache: SemanticCache=None):
+    # Stages report per-query counters (rerank pairs saved, ...) into this scope; they land in the log record
+    # The whole query runs on one index snapshot even if a reload swaps in a new one meanwhile
+    with collect_stats() as stats, (engine.pin() if engine is not None else nullcontext()) as snap:
+        if semantic_cache is not None and snap is not None:
+            semantic_cache.set_version(snap.version)  # candidates of a swapped-out snapshot are never served
+        return _ask(engine, query, graph=graph, graph_topn=graph_topn, logger=logger, flags=flags,
+                    cache=cache, cache_key=cache_key, cached=cached, semantic_cache=semantic_cache, stats=stats,
+                    index_version=snap.version if snap is not None else None)
+
+
+def _ask(engine, query, *, graph, graph_topn, logger, flags, cache, cache_key, cached, semantic_cache, stats,
+         index_version=None):
     # === Your original query & printing ===
     flags = flags or {}
-    # resp = engine.query(query)
+    cache_hit = False  # `cached` is the caller's cache.get(cache_key) result; misses get stored below
+    semantic_hit = None
+    qb = QueryBundle(query_str=query)
+    sem_key = None
+    if semantic_cache is not None and cached is None:
+        # Embed once: the vector feeds both the semantic lookup and (on a miss) all three retrievers
+        with span("embed.query"):
+            qb.embedding = Settings.embed_model.get_query_embedding(query)
+        sem_key = SemanticCache.params_key(**{k: v for k, v in flags.items()
+                                              if k not in ("graph", "graph_topn", "log_jsonl")})
+        semantic_hit = semantic_cache.lookup(qb.embedding, sem_key)
+    # retrieve -> rank -> pack -> synthesize; `ranked` is kept for the fallback and GraphRAG
+    if cached is not None:
+        with span("cache.hit"):
+            resp = Response(response=cached.get("response"), source_nodes=payload_to_nodes(cached.get("nodes")))
+            ranked = payload_to_nodes(cached.get("ranked")) if cached.get("ranked") else resp.source_nodes
+        cache_hit = True
+        index_version = cached.get("index_version")
+        print("[CACHE] hit")
+    elif semantic_hit is not None:
+        print(f"[CACHE] semantic hit sim={semantic_hit.similarity:.3f} via {semantic_hit.matched_query!r}")
+        ranked = payload_to_nodes(semantic_hit.value.get("nodes"))
+    else:
+        ranked = engine.rank(qb, engine.retrieve(qb))
+
+    # GraphRAG only needs the ranked nodes: run claim extraction + graph building while the
+    # answer is synthesized (the copied context keeps its span in this query's trace)
+    graph_job = pool = None
+    graph_lines = None
+    if graph and semantic_hit is not None:
+        # Paraphrased traffic skips the graph work too: replay the lines stored with the candidates
+        stored = semantic_hit.value.get("graph")
+        graph_lines = stored if stored is not None and semantic_hit.value.get("graph_topn") == graph_topn \
+            else [f"[GraphRAG] skipped on semantic hit (no stored check for graph_topn={graph_topn})"]
+    elif graph:
+        def _graph():
+            with span("graphrag", topn=graph_topn):
+                return run_graphrag_on_nodes(ranked, topn=graph_topn, query=query)
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="graphrag")
+        graph_job = pool.submit(contextvars.copy_context().run, _graph)
     try:
-        resp = engine.query(query)
-    except ValueError as e:
-        if "available context size" in str(e):
-            print("[WARN] answer synthesis overflow; falling back to no_text")
-            from llama_index.core.query_engine import RetrieverQueryEngine
-            retriever = engine._retriever
-            post = list(engine._node_postprocessors or [])
-            engine2 = RetrieverQueryEngine.from_args(
-                retriever, node_postprocessors=post, response_mode="no_text"
-            )
-            resp = engine2.query(query)
-        else:
-            raise
-    used_sources = []
-    for sn in resp.source_nodes:
-        src = (sn.metadata or {}).get("source")
-        if src:
-            used_sources.append(src)
-    print("[LOG] Sources used:", sorted(set(used_sources)))
-
-    print("\n=== ANSWER ===")
-    print(resp.response)
-
-    print("\n=== CITED CHUNKS (top few) ===")
-    for i, sn in enumerate(resp.source_nodes[:10], 1):
-        meta = sn.metadata or {}
-        score = sn.score if sn.score is not None else 0.0
-        print(f"[{i}] source={meta.get('source')} id={meta.get('id')} score={score:.4f}")
-
-    # === Only do GraphRAG contradiction check when needed (based on resp) ===
-    if graph:
-        run_graphrag_on_response(resp, topn=graph_topn, query=query)
-        # === Structured logging (persist to disk) ===
-
-    if flags.get("log_txt"):  # We'll insert args.log_txt into flags at the call site
+        if not cache_hit:
+            _, _, resp, t_synth = engine.run(qb, ranked=ranked)
+        streaming = isinstance(resp, StreamingResponse)
+        if not cache_hit and not streaming:
+            record(synth_ms=round((time.perf_counter() - t_synth) * 1000, 3))
+
         used_sources = []
-        chunks_strs = []
         for sn in resp.source_nodes:
-            m = sn.metadata or {}
-            used_sources.append(m.get("source"))
-            chunks_strs.append(f"{m.get('source')}:{m.get('id')}:{float(sn.score or 0.0):.4f}")
-
-        line = (
-            f"[{datetime.utcnow().isoformat()}Z] "
-            f"q={query!r} "
-            f"sources={sorted(set(s for s in used_sources if s))} "
-            f"topk={len(resp.source_nodes)} "
-            f"chunks={' | '.join(chunks_strs)} "
-            f"flags={{rerank:{bool(flags.get('rerank'))}, graph:{bool(flags.get('graph'))}, "
-            f"per_source_topk:{flags.get('per_source_topk')}}}"
-        )
-        write_text_log(log_txt, line)
+            src = (sn.metadata or {}).get("source")
+            if src:
+                used_sources.append(src)
+        print("[LOG] Sources used:", sorted(set(used_sources)))
+
+        # Citations first: with --stream they are on screen before the first answer token
+        print("\n=== CITED CHUNKS (top few) ===")
+        for i, sn in enumerate(resp.source_nodes[:10], 1):
+            meta = sn.metadata or {}
+            score = sn.score if sn.score is not None else 0.0
+            print(f"[{i}] source={meta.get('source')} id={meta.get('id')} score={score:.4f}")
+
+        print("\n=== ANSWER ===")
+        if streaming:
+            parts = []
+            with span("synthesize.stream") as s:
+                for tok in resp.response_gen:
+                    if not parts:
+                        record(ttft_ms=round((time.perf_counter() - t_synth) * 1000, 3))
+                    parts.append(tok)
+                    print(tok, end="", flush=True)
+                if s is not None:
+                    s.set(chunks=len(parts))
+            print()
+            record(synth_ms=round((time.perf_counter() - t_synth) * 1000, 3))
+            resp = Response(response="".join(parts), source_nodes=resp.source_nodes)
+        else:
+            print(resp.response)
+
+        # === GraphRAG contradiction check (computed alongside synthesis above) ===
+        if graph_job is not None:
+            graph_lines = graph_job.result()
+        for line in graph_lines or []:
+            print(line)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+    # Every response names the index snapshot it was served from
+    resp.metadata = dict(resp.metadata or {}, index_version=index_version)
+    print(f"[LOG] index version: {index_version}")
+    if cache is not None and not cache_hit:
+        cache.put(cache_key, {
+            "response": None if resp.response is None else str(resp.response),
+            "nodes": nodes_to_payload(resp.source_nodes),
+            "ranked": nodes_to_payload(ranked),
+            "index_version": index_version,
+        })
+    if sem_key is not None and semantic_hit is None:
+        semantic_cache.add(qb.embedding, sem_key, query, {"nodes": nodes_to_payload(ranked), "graph": graph_lines,
+                                                          "graph_topn": graph_topn if graph else None})
+
+    # === Structured logging (persist to disk) ===
+    if logger is not None:
+        tr = current_trace()
+        logger.log(build_query_record(
+            query, resp.source_nodes, flags,
+            timings=tr.stage_timings() if tr is not None else None,
+            trace_id=tr.trace_id if tr is not None else None,
+            cache_hit=cache_hit,
+            index_version=index_version,
+            semantic_hit=None if semantic_hit is None else round(semantic_hit.similarity, 4),
+            stats=dict(stats),
+        ))
     return resp  # Keep this if callers want to further use resp; harmless to retain
 
-def write_text_log(path: str, line: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(line.rstrip() + "\n")
-    print(f"[LOG] text log written -> {path}")
-
-class TopK(BaseNodePostprocessor):
-    def __init__(self, k:int): self.k=k
-    def postprocess_nodes(self, nodes, query_bundle=None): return nodes[:self.k]
-
-class TruncateNodeText(BaseNodePostprocessor):
-    def __init__(self, max_chars:int=1200): self.max_chars=max_chars
-    def postprocess_nodes(self, nodes, query_bundle=None):
-        for n in nodes:
-            if getattr(n, "text", None):
-                n.text = n.text[:self.max_chars]
-            elif getattr(getattr(n, "node", None), "text", None):
-                n.node.text = n.node.text[:self.max_chars]
-        return nodes
+def build_snapshot(args, rerank_tokenizer=None) -> IndexSnapshot:
+    """Index the chunk artifact into one versioned snapshot of per-source retrievers.
+
+    With `rerank_tokenizer` (--rerank-pretok) the passage token cache of the same artifact
+    is built into the snapshot too, so a reload swaps both together.
+    """
+    # Version first: an artifact rewritten mid-build then shows up as a newer version on the next check
+    version = artifact_version(args.chunks)
+    # Stream rows, route by source, and embed into three "weighted vector retrievers"
+    # batch by batch; --lexical adds the BM25 index on top (see load_bm25)
+    embed_pool = None
+    if args.embed_workers:
+        from src.embedding.pool import EmbeddingPool
+        embed_pool = EmbeddingPool(args.model, workers=args.embed_workers,
+                                   batch_size=args.embed_batch_size, torch_threads=args.embed_threads)
+    index_batch = args.index_batch_size
+    if embed_pool is not None:
+        # Give every worker at least one full batch per flush
+        index_batch = max(index_batch, embed_pool.workers * args.embed_batch_size)
+    # Over the RSS budget the build keeps going with smaller index/embedding batches
+    mem_budget = MemoryBudget(args.mem_budget_mb) if args.mem_budget_mb else None
+    if args.shards:
+        # Vectors live in N shard processes; each query is scattered to all of them
+        retrievers, shard_index = build_sharded_retrievers(
+            iter_chunk_rows(args.chunks), shards=args.shards, top_k=args.vec_topk,
+            batch_size=index_batch, embed_pool=embed_pool, mem_budget=mem_budget,
+        )
+        close = shard_index.close
+    else:
+        close = None
+        retrievers = build_all_retrievers_streaming(
+            iter_chunk_rows(args.chunks), top_k=args.vec_topk, batch_size=index_batch,
+            embed_pool=embed_pool, mem_budget=mem_budget,
+        )
+    if embed_pool is not None:
+        print(embed_pool.report())
+        embed_pool.close()
+    if args.lexical != "off":
+        retrievers = add_lexical(retrievers, load_bm25(args), mode=args.lexical,
+                                 top_k=args.vec_topk, top_m=args.lexical_topm)
+    extras = {}
+    if rerank_tokenizer is not None:
+        extras["passage_cache"] = build_passage_cache(args, rerank_tokenizer, version)
+    return IndexSnapshot(version, {r.name: r for r in retrievers}, close=close, extras=extras)
+
+def load_bm25(args) -> BM25Index:
+    """The BM25 index of --chunks; (re)built from the jsonl unless it was built from this artifact version."""
+    path = args.bm25_index or bm25_path(args.chunks)
+    if ChunkStore.is_store(args.chunks):
+        # Built by `chunk --bm25` from the jsonl next to the store; nothing here to rebuild it from
+        try:
+            bm25 = BM25Index(path)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"[BM25] no usable index at {path} ({e}); run `chunk --bm25` and pass --bm25-index")
+    else:
+        with mem_stage("bm25_build"):
+            bm25 = load_or_build_bm25(args.chunks, artifact_version(args.chunks), path)
+    print(f"[BM25] {len(bm25)} chunks, {bm25.nbytes / 1e6:.1f} MB ({args.lexical}) <- {path}")
+    return bm25
+
+def build_passage_cache(args, tokenizer, version: str = None):
+    """Rerank-side token ids of every chunk, tokenized once per corpus build and kept next to the artifact."""
+    from llama_index.core.schema import MetadataMode
+    from src.fusion.utils import row_to_document
+    from src.rerank.pretokenized import cache_path, load_or_build_cache
+
+    def passages():
+        for r in iter_chunk_rows(args.chunks):
+            doc = row_to_document(r)
+            yield doc.metadata["id"], doc.get_content(metadata_mode=MetadataMode.EMBED)
+
+    path = cache_path(args.chunks, args.rerank_model)
+    with mem_stage("rerank_pretok"):
+        cache = load_or_build_cache(path, passages, tokenizer, args.rerank_model,
+                                    version or artifact_version(args.chunks))
+    print(f"[RERANK] {len(cache)} passages pre-tokenized ({cache.nbytes / 1e6:.1f} MB) -> {path}")
+    return cache
+
+def build_engine(args):
+    """Index the chunk artifact and assemble the query engine for the `fusion` subcommand."""
+    reranker = None
+    if args.rerank:
+        from src.rerank.cross_encoder import build_reranker
+        reranker = build_reranker(model=args.rerank_model, top_n=args.rerank_topn, pretokenized=args.rerank_pretok)
+    tokenizer = reranker.tokenizer if args.rerank and args.rerank_pretok else None
+
+    # Retrievers resolve to the snapshot each query pinned, so a reloaded index can be swapped in
+    snapshots = SnapshotManager(build_snapshot(args, tokenizer))
+    atexit.register(snapshots.close)
+    if args.watch_interval:
+        # Rebuild in the background whenever the artifact changes; only matters to long-lived callers
+        # (e.g. QueryService(build_engine(args))), a one-shot CLI query exits first
+        stop = snapshots.watch(lambda: artifact_version(args.chunks), lambda: build_snapshot(args, tokenizer),
+                               interval=args.watch_interval)
+        atexit.register(stop.set)
+    # One per retriever of the snapshot: the three sources, plus "bm25" with --lexical fuse
+    retrievers = [SnapshotRetriever(snapshots, s) for s in snapshots.current.retrievers]
+    if tokenizer is not None:
+        # Passage ids come from the pinned snapshot, so they always match the corpus being ranked
+        reranker.set_cache(lambda: (current_snapshot() or snapshots.current).extras.get("passage_cache"))
+
+    # Simple RRF fusion (we define it in src/fusion/query_fusion.py)
+    # engine = build_fusion_engine(
+    #     retrievers,
+    #     per_source_top_k=args.per_source_topk,
+    # )
+
+    # Query + logging
+    # ask(engine, args.q)
+
+    # Build the engine: just pass the reranker in
+    engine = build_fusion_engine(
+        retrievers,
+        per_source_top_k=args.per_source_topk,
+        reranker=reranker,  # ← only takes effect when --rerank is enabled
+        collapse_budget=args.collapse_budget if args.collapse_siblings else None,
+        adaptive=AdaptiveK(min_k=args.adaptive_min_k, max_k=args.vec_topk, rel=args.adaptive_rel,
+                           gap=args.adaptive_gap, max_total=args.max_candidates) if args.adaptive_k else None,
+    )
+    if args.answer:
+        require_openai_key()
+        from llama_index.llms.openai import OpenAI
+        Settings.llm = OpenAI(
+            model=args.llm_model,
+            temperature=0,
+            max_tokens=512,  # limit output length
+            context_window=1200000,  # large window to avoid context underflow
+            api_key=os.getenv("OPEN_API_KEY"),
+            api_base=args.llm_api_base,  # None -> OPENAI_BASE_URL or api.openai.com
+        )
+
+        # Synthesize in "compact" mode (reuse the engine's retriever and rank postprocessors)
+        from llama_index.core.response_synthesizers import get_response_synthesizer
+        synth = get_response_synthesizer(response_mode="compact", streaming=args.stream)
+        # Pack the best nodes into a fixed prompt budget, counted in the LLM's own tokens; the budget is
+        # charged for the prompt the synthesizer really sends (the chat template's system message included)
+        pack = TracedPostprocessor(inner=ContextPacker(
+            model=args.llm_model, budget_tokens=args.answer_budget, max_nodes=args.answer_topk,
+            qa_template=synth.get_prompts()["text_qa_template"].select(Settings.llm),
+        ), stage="pack")
+        return QueryPipeline(engine._retriever, engine._node_postprocessors, [pack], synth, snapshots=snapshots)
+    return QueryPipeline.from_engine(engine, snapshots=snapshots)
 
 def main():
     ap = argparse.ArgumentParser(prog="astraml")
@@ -165,25 +378,92 @@ def main():
     sp_chunk.add_argument("--out", default="artifacts/chunks.jsonl", help="Output JSONL file")
     sp_chunk.add_argument("--sources", nargs="*", default=["docs","forums","blogs"],
                           choices=["docs","forums","blogs"], help="Which sources to include")
+    sp_chunk.add_argument("--columnar", default=None,
+                          help="Also write a memory-mapped columnar chunk store to this directory")
+    sp_chunk.add_argument("--mem-profile", action="store_true",
+                          help="Report peak RSS / Python heap and top allocators per stage")
+    sp_chunk.add_argument("--bm25", action="store_true",
+                          help="Also write a BM25 inverted index next to --out (<out>.bm25.npz)")
+    sp_chunk.add_argument("--dedup", action="store_true",
+                          help="Collapse near-duplicate chunks (MinHash/LSH) into one row that keeps all member ids")
+    sp_chunk.add_argument("--dedup-threshold", type=float, default=0.95,
+                          help="Estimated Jaccard over word 5-gram shingles at which chunks are collapsed")
 
     # --- fusion subcommand (rewritten: pure vector + simple RRF fusion; no bm25/num_queries/mode) ---
-    sp_fusion = sp.add_parser("fusion", help="Query with simple multi-source vector fusion (RRF), no OpenAI/BM25")
-    sp_fusion.add_argument("--chunks", default="artifacts/chunks.jsonl")
+    sp_fusion = sp.add_parser("fusion", help="Query with simple multi-source vector fusion (RRF), no OpenAI")
+    sp_fusion.add_argument("--chunks", default="artifacts/chunks.jsonl",
+                           help="chunks.jsonl or a columnar store directory written by `chunk --columnar`")
     sp_fusion.add_argument("--q", required=True)
     sp_fusion.add_argument("--model", default="intfloat/e5-small-v2")  # CPU OK
     sp_fusion.add_argument("--vec-topk", type=int, default=30, help="Per-source vector retriever top_k")
     sp_fusion.add_argument("--per-source-topk", type=int, default=10, help="K taken from each retriever before fusion")
+    sp_fusion.add_argument("--adaptive-k", action="store_true",
+                           help="Cut each source's candidates at its score elbow / relative threshold")
+    sp_fusion.add_argument("--adaptive-min-k", type=int, default=3, help="Floor of the adaptive per-source k")
+    sp_fusion.add_argument("--adaptive-rel", type=float, default=0.9,
+                           help="Keep candidates scoring >= this fraction of the source's top score")
+    sp_fusion.add_argument("--adaptive-gap", type=float, default=3.0,
+                           help="Cut at the largest score gap if it is >= this x the median gap")
+    sp_fusion.add_argument("--max-candidates", type=int, default=None,
+                           help="Cap on the summed adaptive k over all sources")
+    sp_fusion.add_argument("--index-batch-size", type=int, default=256,
+                           help="Chunks embedded per batch while streaming the index build")
+    sp_fusion.add_argument("--embed-workers", type=int, default=0,
+                           help="Embedding worker processes for the index build (0 = in-process)")
+    sp_fusion.add_argument("--embed-batch-size", type=int, default=64,
+                           help="Texts per embedding batch (batches are length-sorted)")
+    sp_fusion.add_argument("--embed-threads", type=int, default=1,
+                           help="torch threads per embedding worker")
+    sp_fusion.add_argument("--mem-profile", action="store_true",
+                           help="Report peak RSS / Python heap and top allocators per stage (slows the run)")
+    sp_fusion.add_argument("--mem-budget-mb", type=float, default=None,
+                           help="RSS budget for the index build (with --shards: coordinator + shard processes); "
+                                "over it, index/embedding batches are halved")
+    sp_fusion.add_argument("--watch-interval", type=float, default=0.0,
+                           help="Poll --chunks every S seconds and swap in a rebuilt index snapshot when it "
+                                "changes (0 = off; for long-lived engines, a single CLI query exits first)")
+    sp_fusion.add_argument("--shards", type=int, default=0,
+                           help="Shard worker processes holding the vectors (0 = in-process indexes)")
+    sp_fusion.add_argument("--lexical", choices=["off", "fuse", "prefilter"], default="off",
+                           help="BM25: fuse = fourth fused retriever; prefilter = dense-score only the lexical top-M")
+    sp_fusion.add_argument("--lexical-topm", type=int, default=200,
+                           help="With --lexical prefilter: lexical candidates per source that get dense scoring")
+    sp_fusion.add_argument("--bm25-index", default=None,
+                           help="BM25 index file (default <chunks>.bm25.npz, built on first use)")
     sp_fusion.add_argument("--final-topk", type=int, default=10, help="Final fused top_k returned")
 
     sp_fusion.add_argument("--rerank", action="store_true", help="Enable cross-encoder reranking")
     sp_fusion.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
     sp_fusion.add_argument("--rerank-topn", type=int, default=10)
+    sp_fusion.add_argument("--rerank-pretok", action=argparse.BooleanOptionalAction, default=False,
+                           help="Experimental: rerank from passages tokenized once per corpus (cached next to "
+                                "--chunks); check eval/bench_rerank.py reports a zero score difference first")
+    sp_fusion.add_argument("--collapse-siblings", action="store_true",
+                           help="Merge adjacent #cN windows of the same file before reranking")
+    sp_fusion.add_argument("--collapse-budget", type=int, default=512,
+                           help="Max tokens of one merged sibling group")
 
     sp_fusion.add_argument("--graph", action="store_true", help="Build a claim-evidence graph on top-N results")
     sp_fusion.add_argument("--graph-topn", type=int, default=10, help="How many results to use when building the graph")
 
-    sp_fusion.add_argument("--log-txt", default=None,
-                           help="Append a human-readable text log for each response")
+    sp_fusion.add_argument("--log-jsonl", "--log-txt", dest="log_jsonl", default=None,
+                           help="Append one structured JSONL record per response (buffered, rotated)")
+    sp_fusion.add_argument("--trace", action="store_true",
+                           help="Time each query stage and print the timing tree")
+    sp_fusion.add_argument("--trace-otel", default=None,
+                           help="Also append the trace as OpenTelemetry (OTLP/JSON) to this file")
+
+    sp_fusion.add_argument("--cache", action="store_true",
+                           help="Serve repeated queries from an LRU+TTL result cache")
+    sp_fusion.add_argument("--cache-dir", default=None,
+                           help="On-disk cache tier (implies --cache); survives across runs")
+    sp_fusion.add_argument("--cache-ttl", type=float, default=3600.0, help="Cache entry lifetime in seconds")
+    sp_fusion.add_argument("--cache-size", type=int, default=1024, help="Max in-memory cache entries")
+    sp_fusion.add_argument("--semantic-cache", action="store_true",
+                           help="Reuse the reranked candidates (and --graph lines) of a paraphrased earlier query; "
+                                "kept in --cache-dir. A hit never runs rerank or GraphRAG")
+    sp_fusion.add_argument("--semantic-threshold", type=float, default=0.95,
+                           help="Min cosine similarity between query embeddings for a semantic hit")
 
     # Append these lines after sp_fusion params:
     sp_fusion.add_argument("--answer", action="store_true",
@@ -192,81 +472,87 @@ def main():
                            help="OpenAI model when --answer is on")
     sp_fusion.add_argument("--answer-topk", type=int, default=12,
                            help="Max nodes passed to answer synthesizer")
-    sp_fusion.add_argument("--answer-maxc", type=int, default=1200,
-                           help="Char cap per node before answer synthesis")
+    sp_fusion.add_argument("--stream", action="store_true",
+                           help="With --answer: print citations first and stream answer tokens as they arrive")
+    sp_fusion.add_argument("--llm-api-base", default=None,
+                           help="OpenAI-compatible base URL (e.g. a local stub: http://127.0.0.1:8011/v1)")
+    sp_fusion.add_argument("--answer-budget", type=int, default=3000,
+                           help="Prompt token budget (template + query + context) for answer synthesis")
 
     args = ap.parse_args()
 
+    if args.mem_profile:
+        enable_mem_profile()
+
     if args.cmd == "chunk":
-        n = run_chunk(args.data_root, args.out, args.sources)
-        print(f"Wrote {n} chunks -> {args.out}")
+        with mem_stage("chunking"):
+            n = run_chunk(args.data_root, args.out, args.sources, columnar_out=args.columnar,
+                          dedup_threshold=args.dedup_threshold if args.dedup else None,
+                          bm25_out=bm25_path(args.out) if args.bm25 else None)
+        print(f"Wrote {n} chunks -> {args.out}" + (f" (+ columnar store {args.columnar})" if args.columnar else ""))
 
     if args.cmd == "fusion":
-        # Disable LLM and enable local open-source embeddings (won't trigger OpenAI)
+        # Disable LLM (won't trigger OpenAI); the local embedding model is loaded only on a cache miss
         Settings.llm = None
-        Settings.embed_model = HuggingFaceEmbedding(model_name=args.model)
-
-        # Read and split by source
-        rows = load_rows_from_jsonl(args.chunks)
-        docs_rows, forums_rows, blogs_rows = partition_rows_by_source(rows)
-
-        # Build three-way "weighted vector retrievers" (vector-only; no BM25)
-        retrievers = build_all_retrievers(
-            docs_rows, forums_rows, blogs_rows, top_k=args.vec_topk
-        )
-
-        # Simple RRF fusion (we define it in src/fusion/query_fusion.py)
-        # engine = build_fusion_engine(
-        #     retrievers,
-        #     per_source_top_k=args.per_source_topk,
-        # )
-
-        # Query + logging
-        # ask(engine, args.q)
-
-        reranker = None
-        if args.rerank:
-            from src.rerank.cross_encoder import build_reranker
-            reranker = build_reranker(model=args.rerank_model, top_n=args.rerank_topn)
-
-        # Build the engine: just pass the reranker in
-        engine = build_fusion_engine(
-            retrievers,
-            per_source_top_k=args.per_source_topk,
-            reranker=reranker,  # ← only takes effect when --rerank is enabled
-        )
-        if args.answer:
-            require_openai_key()
-            from llama_index.llms.openai import OpenAI
-            Settings.llm = OpenAI(
-                model=args.llm_model,
-                temperature=0,
-                max_tokens=512,  # limit output length
-                context_window=1200000,  # large window to avoid context underflow
-                api_key=os.getenv("OPEN_API_KEY")
-            )
-
-            # Rebuild the existing engine as "compact" (reuse its retriever and existing postprocessors)
-            from llama_index.core.query_engine import RetrieverQueryEngine
-            retriever = engine._retriever
-            post = list(engine._node_postprocessors or [])
-            # Two safeguards to prevent oversized context fed to the LLM
-            post.append(TopK(args.answer_topk))
-            post.append(TruncateNodeText(args.answer_maxc))
-            engine = RetrieverQueryEngine.from_args(
-                retriever, node_postprocessors=post, response_mode="compact"
-            )
 
         flags = {
+            "model": args.model,
+            "vec_topk": args.vec_topk,
+            "final_topk": args.final_topk,
+            "answer": bool(args.answer),
+            "llm_model": args.llm_model if args.answer else None,
+            "answer_budget": [args.answer_budget, args.answer_topk] if args.answer else None,
             "rerank": bool(getattr(args, "rerank", False)),
             "rerank_model": getattr(args, "rerank_model", None) if getattr(args, "rerank", False) else None,
             "rerank_topn": getattr(args, "rerank_topn", None) if getattr(args, "rerank", False) else None,
+            "collapse_budget": args.collapse_budget if args.rerank and args.collapse_siblings else None,
             "graph": bool(getattr(args, "graph", False)),
             "graph_topn": getattr(args, "graph_topn", None),
             "per_source_topk": getattr(args, "per_source_topk", None),
-            "log_txt": getattr(args, "log_txt", None)
+            "lexical": [args.lexical, args.lexical_topm if args.lexical == "prefilter" else None]
+                       if args.lexical != "off" else None,
+            "adaptive_k": [args.adaptive_min_k, args.adaptive_rel, args.adaptive_gap, args.max_candidates]
+                          if args.adaptive_k else None,
+            "log_jsonl": getattr(args, "log_jsonl", None)
         }
-        ask(engine, args.q, graph=args.graph, graph_topn=args.graph_topn, log_txt=getattr(args, "log_txt", None), flags=flags)
+        cache = cache_key = cached = None
+        if args.cache or args.cache_dir:
+            cache = QueryCache(max_entries=args.cache_size, ttl=args.cache_ttl, disk_dir=args.cache_dir,
+                               version=artifact_version(args.chunks))
+            cache_key = cache.make_key(args.q, **{k: v for k, v in flags.items()
+                                                  if k not in ("graph", "graph_topn", "log_jsonl")})
+            cached = cache.get(cache_key)
+        if cached is None:
+            # Imported here: spawned workers re-import this module and must not pull in torch at import
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+            Settings.embed_model = HuggingFaceEmbedding(model_name=args.model)
+        semantic_cache = None
+        if args.semantic_cache and cached is None:
+            semantic_cache = SemanticCache(threshold=args.semantic_threshold, ttl=args.cache_ttl,
+                                           version=artifact_version(args.chunks),
+                                           path=os.path.join(args.cache_dir, "semantic.json") if args.cache_dir else None)
+        # A cache hit skips the embedding model, the index build and the query embedding altogether
+        engine = build_engine(args) if cached is None else None
+
+        logger = QueryLogger(args.log_jsonl) if args.log_jsonl else None
+        with start_trace("ask", enabled=bool(args.trace or args.trace_otel), q=args.q) as tr:
+            ask(engine, args.q, graph=args.graph, graph_topn=args.graph_topn, logger=logger, flags=flags,
+                cache=cache, cache_key=cache_key, cached=cached, semantic_cache=semantic_cache)
+        if semantic_cache is not None:
+            semantic_cache.save()
+        if logger is not None:
+            logger.close()
+            print(f"[LOG] query log written -> {args.log_jsonl}")
+        if tr is not None:
+            print("\n=== TRACE (ms) ===")
+            print(tr.format_tree())
+            if args.trace_otel:
+                export_otel_json(tr, args.trace_otel)
+                print(f"[LOG] trace written -> {args.trace_otel}")
+
+    if mem_profiler() is not None:
+        print("\n=== MEMORY (per stage) ===")
+        print(mem_profiler().report())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,147 @@
+# src/cache/query_cache.py
+"""
+LRU + TTL result cache for ask().
+
+Key = (normalized query, retrieval/rerank/answer flags, index version). The index
+version is folded into every key and stored in every entry, so a new chunk
+artifact or index snapshot makes old entries unreachable (memory) and rejected
+on read (disk) without any explicit purge.
+
+Values are plain JSON: {"response": str|None, "nodes": [{"id_", "text", "metadata",
+"excluded_embed", "excluded_llm", "score"}]}.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.schema import NodeWithScore, TextNode
+
+_ws = re.compile(r"\s+")
+PAYLOAD_FORMAT = 2  # in every key: disk entries written before the excluded-key lists are never served
+
+
+def normalize_query(q: str) -> str:
+    """Case/whitespace-insensitive form; trailing ?/./! do not change the answer."""
+    return _ws.sub(" ", (q or "").strip().lower()).rstrip("?.! ")
+
+
+def nodes_to_payload(nodes: List[NodeWithScore]) -> List[Dict[str, Any]]:
+    out = []
+    for n in nodes or []:
+        out.append({
+            "id_": n.node.node_id,
+            "text": n.node.get_content(),
+            "metadata": dict(n.node.metadata or {}),
+            # Hidden keys (priors, dup provenance) must stay out of LLM / embed text after a cache hit
+            "excluded_embed": list(n.node.excluded_embed_metadata_keys or []),
+            "excluded_llm": list(n.node.excluded_llm_metadata_keys or []),
+            "score": n.score,
+        })
+    return out
+
+
+def payload_to_nodes(payload: List[Dict[str, Any]]) -> List[NodeWithScore]:
+    return [NodeWithScore(node=TextNode(id_=p["id_"], text=p["text"], metadata=p["metadata"],
+                                        excluded_embed_metadata_keys=p.get("excluded_embed", []),
+                                        excluded_llm_metadata_keys=p.get("excluded_llm", [])),
+                          score=p["score"])
+            for p in payload or []]
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, disk_dir: Optional[str] = None,
+                 version: str = ""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def make_key(self, query: str, **params) -> str:
+        blob = json.dumps({"q": normalize_query(query), "v": self.version, "fmt": PAYLOAD_FORMAT, **params},
+                          sort_keys=True, default=str)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def set_version(self, version: str):
+        """Switch to a new index version; in-memory entries of the old one are dropped."""
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._mem.clear()
+
+    # ---- Lookup ----
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._mem[key]
+        val = self._disk_get(key, now)
+        with self._lock:
+            if val is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._mem_put(key, val, now)
+        return val
+
+    def put(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, value, now)
+        self._disk_put(key, value, now)
+
+    def _mem_put(self, key: str, value: Dict[str, Any], now: float):
+        self._mem[key] = (now + self.ttl, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    # ---- Disk tier ----
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        p = self._disk_path(key)
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                ent = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if ent.get("version") != self.version or ent.get("expires", 0) <= now:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            return None
+        return ent.get("value")
+
+    def _disk_put(self, key: str, value: Dict[str, Any], now: float):
+        if not self.disk_dir:
+            return
+        p = self._disk_path(key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": self.version, "expires": now + self.ttl, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp, p)  # atomic: readers never see a partial entry
+        except OSError as e:
+            print("[cache] disk write failed:", e)
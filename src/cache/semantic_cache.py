@@ -0,0 +1,143 @@
+# src/cache/semantic_cache.py
+"""
+Opt-in semantic cache for paraphrased queries.
+
+Holds the normalized embeddings of the last `capacity` queries in a ring buffer
+(one float32 matrix). A lookup is one matrix-vector product over the slots that
+share the same retrieval/rerank flags; at a few thousand entries that is cheaper
+than maintaining a real ANN structure and is exact. A hit returns the reranked
+candidate list stored for the earlier query, so retrieval, fusion and the
+cross-encoder are skipped; only synthesis (with the new query) still runs.
+
+With `path` the live entries are saved as one JSON file (save()) and read back on
+construction, so one-query-per-process CLI runs can hit each other. Entries of
+another index version are dropped on load, like set_version() drops them in memory.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+class SemanticHit(NamedTuple):
+    value: Dict[str, Any]
+    similarity: float
+    matched_query: str
+
+
+class SemanticCache:
+    def __init__(self, capacity: int = 2048, threshold: float = 0.95, ttl: float = 3600.0, version: str = "",
+                 path: Optional[str] = None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._emb: Optional[np.ndarray] = None  # (capacity, dim), rows L2-normalized
+        self._params: List[Optional[str]] = [None] * capacity
+        self._expires = np.zeros(capacity, dtype=np.float64)
+        self._queries: List[str] = [""] * capacity
+        self._values: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._next = 0
+        self._lock = threading.Lock()
+        self.path = path
+        if path:
+            self._load()
+
+    @staticmethod
+    def params_key(**params) -> str:
+        blob = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _unit(emb: Sequence[float]) -> np.ndarray:
+        v = np.asarray(emb, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def set_version(self, version: str):
+        """New index version: every stored candidate list is stale."""
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._expires[:] = 0.0
+                self._values = [None] * self.capacity
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def lookup(self, emb: Sequence[float], params_key: str) -> Optional[SemanticHit]:
+        q = self._unit(emb)
+        with self._lock:
+            if self._emb is None:
+                self.misses += 1
+                return None
+            live = (self._expires > time.time()) & np.fromiter(
+                (p == params_key for p in self._params), dtype=bool, count=self.capacity)
+            if not live.any():
+                self.misses += 1
+                return None
+            sims = self._emb @ q
+            sims[~live] = -np.inf
+            i = int(np.argmax(sims))
+            if sims[i] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return SemanticHit(self._values[i], float(sims[i]), self._queries[i])
+
+    def add(self, emb: Sequence[float], params_key: str, query: str, value: Dict[str, Any]):
+        v = self._unit(emb)
+        with self._lock:
+            if self._emb is None:
+                self._emb = np.zeros((self.capacity, v.shape[0]), dtype=np.float32)
+            i = self._next
+            self._next = (i + 1) % self.capacity
+            self._emb[i] = v
+            self._params[i] = params_key
+            self._expires[i] = time.time() + self.ttl
+            self._queries[i] = query
+            self._values[i] = value
+
+    # ---- Persistence ----
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                ent = json.load(f)
+        except (OSError, ValueError):
+            return
+        if ent.get("version") != self.version:
+            return
+        now = time.time()
+        for e in ent.get("entries", []):
+            if e["expires"] > now:
+                self.add(e["emb"], e["params"], e["query"], e["value"])
+                self._expires[(self._next - 1) % self.capacity] = e["expires"]
+
+    def save(self):
+        """Write the live entries to `path` (no-op without one)."""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            live = [] if self._emb is None else [
+                {"emb": self._emb[i].tolist(), "params": self._params[i], "query": self._queries[i],
+                 "expires": float(self._expires[i]), "value": self._values[i]}
+                for i in range(self.capacity) if self._expires[i] > now and self._values[i] is not None]
+            ent = {"version": self.version, "entries": live}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(ent, f, ensure_ascii=False)
+            os.replace(tmp, self.path)  # atomic: a concurrent run never reads a partial file
+        except OSError as e:
+            print("[cache] semantic cache write failed:", e)
@@ -1,6 +1,6 @@
 import os, regex as re
 from typing import Dict, Iterable, List
-from .common import strip_front_matter, extract_title, separate_code_blocks, normalize_space, tokens, windows
+from .common import strip_front_matter, extract_title, separate_code_blocks, normalize_space, TokenStream
 
 FRONT = re.compile(r"^---\\s*\\n([\\s\\S]*?)\\n---\\s*", re.M)
 def parse_front(md: str) -> Dict:
@@ -14,15 +14,14 @@ def parse_front(md: str) -> Dict:
     return out
 
 def _pack_blog_prose(text: str) -> List[str]:
-    t = tokens(text)
-    n = len(t)
+    """Token windows over the prose; returned strings are already space-normalized."""
+    ts = TokenStream(text)
+    n = len(ts)
     if n == 0: return []
-    if n < 80: return [" ".join(t)]
+    if n < 80: return [ts.joined]
     if n <= 180:
-        segs = windows(t, max_tokens=140, overlap=20)
-        return [" ".join(s) for s in segs]
-    segs = windows(t, max_tokens=200, overlap=50)
-    return [" ".join(s) for s in segs]
+        return ts.windows(max_tokens=140, overlap=20)
+    return ts.windows(max_tokens=200, overlap=50)
 
 def chunk_blog(md_text: str, rel_path: str) -> Iterable[Dict]:
     meta = parse_front(md_text)
@@ -34,11 +33,11 @@ def chunk_blog(md_text: str, rel_path: str) -> Iterable[Dict]:
     prose, codes = separate_code_blocks(body)
     idx = 0
     for pc in _pack_blog_prose(prose):
-        if pc.strip():
+        if pc:
             yield {
                 "id": f"{rel_path}#c{idx}",
                 "source": "blogs",
-                "text": normalize_space(pc),
+                "text": pc,
                 "meta": {"post_title": title, "author": author, "published_date": date, "content_type": "prose"}
             }
             idx += 1
@@ -1,4 +1,5 @@
 import regex as re
+from itertools import accumulate
 from typing import List, Tuple, Iterable, Optional
 
 FRONT_MATTER_RE = re.compile(r"^---[\\s\\S]*?---\\s*", re.M)
@@ -49,17 +50,63 @@ def separate_code_blocks(md: str):
 def normalize_space(s: str) -> str:
     return re.sub(r"\\s+", " ", s).strip()
 
+TOKEN_RE = re.compile(r"\\w+|\\S")
+
 def tokens(text: str) -> List[str]:
-    return re.findall(r"\\w+|\\S", text)
+    return TOKEN_RE.findall(text)
 
-def windows(tok: List[str], max_tokens: int, overlap: int):
-    if len(tok) <= max_tokens:
-        return [tok]
+# What TOKEN_RE was meant to match. TOKEN_RE stays as is so chunk boundaries (and ids) don't move;
+# consumers that need real word tokens (the BM25 index) use this one.
+WORD_RE = re.compile(r"\w+|\S")
+
+def word_tokens(text: str) -> List[str]:
+    return WORD_RE.findall(text)
+
+def window_spans(n: int, max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    """Token index ranges [i, j) of the sliding windows over n tokens."""
+    if n <= max_tokens:
+        return [(0, n)]
     out, i = [], 0
-    while i < len(tok):
-        j = min(len(tok), i + max_tokens)
-        out.append(tok[i:j])
-        if j == len(tok):
+    while i < n:
+        j = min(n, i + max_tokens)
+        out.append((i, j))
+        if j == n:
             break
         i = max(0, j - overlap)
     return out
+
+def windows(tok: List[str], max_tokens: int, overlap: int):
+    return [tok[i:j] for i, j in window_spans(len(tok), max_tokens, overlap)]
+
+class TokenStream:
+    """
+    `" ".join(tokens(text))` built once, plus the offset of every token in it.
+    Window [i, j) is then one slice of `joined` instead of a list copy + join + normalize_space;
+    no token contains a normalize_space() match, so every slice is already normalized.
+    """
+    __slots__ = ("joined", "n", "_toks", "_starts")
+
+    def __init__(self, text: str, token_re=TOKEN_RE):
+        self._toks = token_re.findall(text)
+        self.n = len(self._toks)
+        self.joined = " ".join(self._toks)
+        self._starts = None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _offsets(self) -> List[int]:
+        if self._starts is None:
+            # cum[k] = total length of tokens [0, k); token k starts at cum[k] + k in `joined`
+            self._starts = list(accumulate(map(len, self._toks), initial=0))
+            self._toks = None
+        return self._starts
+
+    def span_text(self, i: int, j: int) -> str:
+        if i == 0 and j == self.n:
+            return self.joined
+        cum = self._offsets()
+        return self.joined[cum[i] + i:cum[j] + j - 1]
+
+    def windows(self, max_tokens: int, overlap: int) -> List[str]:
+        return [self.span_text(i, j) for i, j in window_spans(self.n, max_tokens, overlap)]
@@ -0,0 +1,114 @@
+# src/chunking/dedup.py
+"""
+Near-duplicate chunk collapse (MinHash over word shingles + LSH banding).
+
+Runs as a two-pass stage over chunks.jsonl so memory is O(#chunks x num_perm)
+small ints, never the texts:
+  pass 1  assign every chunk to a representative (first chunk, in file order, whose
+          estimated Jaccard >= threshold) — only representatives enter the LSH buckets
+  pass 2  write representatives, each carrying meta["dup_members"] = [{"id","source"}, ...]
+          for the chunks folded into it; members are dropped from the output.
+File order is docs -> forums -> blogs, so a docs chunk wins over a forum/blog copy.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+DUP_KEY = "dup_members"
+
+_word = re.compile(r"\w+")
+_PRIME = (1 << 31) - 1
+
+
+def _iter_jsonl(path) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def shingles(text: str, k: int = 5) -> np.ndarray:
+    """31-bit hashes of the word k-grams (a single gram for short texts)."""
+    words = _word.findall((text or "").lower())
+    if len(words) < k:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) & 0x7FFFFFFF for g in grams),
+                       dtype=np.int64, count=len(grams))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 13):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.int64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.int64)
+
+    def signature(self, text: str) -> np.ndarray:
+        x = shingles(text)
+        # (num_perm, n_shingles) universal hashes; a*x < 2^62 so int64 never overflows
+        h = (self.a[:, None] * x[None, :] + self.b[:, None]) % _PRIME
+        return h.min(axis=1).astype(np.int32)
+
+
+class LSHDeduper:
+    """Greedy representative assignment; bands x rows must equal num_perm."""
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 8):
+        assert num_perm % bands == 0
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._reps: Dict[int, np.ndarray] = {}
+
+    def assign(self, i: int, text: str) -> Tuple[int, float]:
+        """Return (representative row index, estimated Jaccard); i itself when it starts a new group."""
+        sig = self.hasher.signature(text)
+        keys = [sig[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+        cands = {r for b, key in enumerate(keys) for r in self._buckets[b].get(key, ())}
+        best, best_sim = i, 0.0
+        for r in sorted(cands):
+            sim = float(np.mean(self._reps[r] == sig))
+            if sim >= self.threshold and sim > best_sim:
+                best, best_sim = r, sim
+        if best == i:
+            self._reps[i] = sig
+            for b, key in enumerate(keys):
+                self._buckets[b][key].append(i)
+        return best, best_sim
+
+
+def dedup_jsonl(in_path: str, out_path: str, threshold: float = 0.85,
+                num_perm: int = 64, bands: int = 8) -> Tuple[int, int]:
+    """Collapse near-duplicate chunks of in_path into out_path. Returns (kept, collapsed)."""
+    lsh = LSHDeduper(threshold=threshold, num_perm=num_perm, bands=bands)
+    members: Dict[int, List[Dict]] = defaultdict(list)
+    rep_of: List[int] = []
+    for i, row in enumerate(_iter_jsonl(in_path)):
+        rep, sim = lsh.assign(i, row.get("text", ""))
+        rep_of.append(rep)
+        if rep != i:
+            members[rep].append({"id": row.get("id"), "source": row.get("source"), "sim": round(sim, 3)})
+
+    tmp = Path(str(out_path) + ".tmp")
+    kept = 0
+    with tmp.open("w", encoding="utf-8") as w:
+        for i, row in enumerate(_iter_jsonl(in_path)):
+            if rep_of[i] != i:
+                continue
+            if members.get(i):
+                row.setdefault("meta", {})[DUP_KEY] = members[i]
+            w.write(json.dumps(row, ensure_ascii=False) + "\n")
+            kept += 1
+    os.replace(tmp, out_path)
+    return kept, len(rep_of) - kept
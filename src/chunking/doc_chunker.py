@@ -4,23 +4,25 @@ from typing import Dict, List, Iterable
 from .common import (
     strip_front_matter, extract_title,
     split_by_h2_h3, separate_code_blocks,
-    normalize_space, tokens, windows
+    normalize_space, TokenStream
 )
 
 # Tunables
 TARGET, MINLEN, MAXLEN, OVERLAP = 280, 120, 380, 70
 
 def _pack_prose(text: str) -> List[str]:
-    """Pack prose into token windows with overlap. Never return an empty list if text has tokens."""
-    toks = tokens(text)
-    n = len(toks)
+    """
+    Pack prose into token windows with overlap. Never return an empty list if text has tokens.
+    Returned strings are already space-normalized (slices of the joined token stream).
+    """
+    ts = TokenStream(text)
+    n = len(ts)
     if n == 0:
         return []
     # keep small sections whole (avoid over-fragmentation)
     if n < MINLEN or n <= TARGET + 40:
-        return [" ".join(toks)]
-    segs = windows(toks, max_tokens=min(MAXLEN, TARGET), overlap=OVERLAP)
-    return [" ".join(s) for s in segs]
+        return [ts.joined]
+    return ts.windows(max_tokens=min(MAXLEN, TARGET), overlap=OVERLAP)
 
 def chunk_doc(md_text: str, rel_path: str) -> Iterable[Dict]:
     """
@@ -45,8 +47,7 @@ def chunk_doc(md_text: str, rel_path: str) -> Iterable[Dict]:
 
         # ---- 2) Prose chunks
         prose_chunks = _pack_prose(prose)
-        for pc in prose_chunks:
-            text = normalize_space(pc)
+        for text in prose_chunks:
             if not text:
                 continue
             yield {
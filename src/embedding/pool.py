@@ -0,0 +1,107 @@
+# src/embedding/pool.py
+"""
+Multi-process embedding pool for index builds.
+
+Each worker process loads one copy of the HuggingFace embedding model with a
+pinned torch thread count (so N workers x T threads never oversubscribes the box).
+Texts are sorted by length before batching to cut padding, and the vectors are
+written back in input order. Nodes that already carry an embedding are skipped by
+VectorStoreIndex, so embed_nodes() + index.insert_nodes() bypasses the in-process embedder.
+"""
+from __future__ import annotations
+import multiprocessing as mp
+import os
+import time
+from typing import List, Optional, Sequence
+
+from llama_index.core.schema import BaseNode, MetadataMode
+
+_worker_model = None
+
+
+def physical_cores() -> int:
+    try:
+        import psutil  # optional
+        n = psutil.cpu_count(logical=False)
+        if n:
+            return n
+    except ImportError:
+        pass
+    return os.cpu_count() or 1
+
+
+def _init_worker(model_name: str, torch_threads: int, batch_size: int):
+    global _worker_model
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    _worker_model = HuggingFaceEmbedding(model_name=model_name, device="cpu", embed_batch_size=batch_size)
+
+
+def _embed_batch(task):
+    idxs, texts = task
+    return idxs, _worker_model.get_text_embedding_batch(texts)
+
+
+class EmbeddingPool:
+    def __init__(self, model_name: str, workers: Optional[int] = None, batch_size: int = 64,
+                 torch_threads: int = 1):
+        self.model_name = model_name
+        self.workers = workers or max(1, physical_cores() // max(1, torch_threads))
+        self.batch_size = batch_size
+        self.torch_threads = torch_threads
+        self.embedded = 0
+        self.seconds = 0.0
+        # spawn: torch/tokenizers are not fork-safe once initialized in the parent
+        self._pool = mp.get_context("spawn").Pool(
+            processes=self.workers,
+            initializer=_init_worker,
+            initargs=(model_name, torch_threads, batch_size),
+        )
+
+    def embed_texts(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed texts across workers; output order matches input order."""
+        if not texts:
+            return []
+        t0 = time.perf_counter()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        tasks = []
+        for s in range(0, len(order), self.batch_size):
+            idxs = order[s:s + self.batch_size]
+            tasks.append((idxs, [texts[i] for i in idxs]))
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        for idxs, vecs in self._pool.imap_unordered(_embed_batch, tasks):
+            for i, v in zip(idxs, vecs):
+                out[i] = v
+        self.embedded += len(texts)
+        self.seconds += time.perf_counter() - t0
+        return out
+
+    def embed_nodes(self, nodes: List[BaseNode]) -> List[BaseNode]:
+        """Fill node.embedding using the same text VectorStoreIndex would embed."""
+        todo = [n for n in nodes if n.embedding is None]
+        vecs = self.embed_texts([n.get_content(metadata_mode=MetadataMode.EMBED) for n in todo])
+        for n, v in zip(todo, vecs):
+            n.embedding = v
+        return nodes
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.embedded / self.seconds if self.seconds else 0.0
+
+    def report(self) -> str:
+        return (f"[embed] {self.embedded} chunks in {self.seconds:.1f}s -> {self.chunks_per_sec:.1f} chunks/s "
+                f"({self.workers} workers x {self.torch_threads} threads, batch={self.batch_size})")
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
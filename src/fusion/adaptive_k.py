@@ -0,0 +1,61 @@
+# src/fusion/adaptive_k.py
+"""
+Adaptive per-source candidate budget.
+
+Each source's biased, score-sorted list is cut at
+  - a relative threshold: keep scores >= rel * top score, and/or
+  - the score elbow: the largest gap between consecutive scores, if it is at least
+    `gap` x the median gap of the list,
+never below `min_k` and never above `max_k`. Afterwards `max_total` caps the sum over
+sources; the overflow is dropped lowest-score-first, but every source keeps its min_k.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+
+
+def choose_k(scores: Sequence[float], min_k: int = 3, max_k: int = 30,
+             rel: Optional[float] = None, gap: Optional[float] = None) -> int:
+    """scores sorted descending; returns how many to keep."""
+    n = min(len(scores), max_k)
+    if n <= min_k:
+        return n
+    s = np.asarray(scores[:n], dtype=np.float64)
+    k = n
+    if rel is not None and s[0] > 0:
+        k = max(min_k, int(np.count_nonzero(s >= s[0] * rel)))
+    if gap is not None and k > min_k:
+        d = s[:k - 1] - s[1:k]          # d[i]: drop between rank i and i+1 -> cutting there keeps i+1
+        med = float(np.median(d))
+        j = int(np.argmax(d[min_k - 1:])) + min_k - 1
+        if d[j] > 0 and d[j] >= gap * max(med, 1e-9):
+            k = j + 1
+    return k
+
+
+class AdaptiveK:
+    def __init__(self, min_k: int = 3, max_k: int = 30, rel: Optional[float] = 0.9,
+                 gap: Optional[float] = 3.0, max_total: Optional[int] = None):
+        self.min_k = min_k
+        self.max_k = max_k
+        self.rel = rel
+        self.gap = gap
+        self.max_total = max_total
+
+    def cut(self, per_source: Dict[str, List[NodeWithScore]]) -> Dict[str, List[NodeWithScore]]:
+        out = {}
+        for name, nodes in per_source.items():
+            k = choose_k([n.score or 0.0 for n in nodes], self.min_k, self.max_k, self.rel, self.gap)
+            out[name] = nodes[:k]
+        total = sum(len(v) for v in out.values())
+        if self.max_total is not None and total > self.max_total:
+            # Beyond each source's floor, keep the globally best scores
+            extra = sorted(((n.score or 0.0, name, i) for name, nodes in out.items()
+                            for i, n in enumerate(nodes) if i >= self.min_k), reverse=True)
+            floor = sum(min(len(v), self.min_k) for v in out.values())
+            keep = {(name, i) for _, name, i in extra[:max(0, self.max_total - floor)]}
+            out = {name: [n for i, n in enumerate(nodes) if i < self.min_k or (name, i) in keep]
+                   for name, nodes in out.items()}
+        return out
@@ -1,5 +1,14 @@
-from typing import Dict, Any, List
-from .utils import build_vector_retriever, BiasedRetriever
+from typing import Dict, Any, List, Iterable
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import MetadataMode
+from llama_index.core.settings import Settings
+from src.telemetry.memory import mem_stage
+from .sharded import ShardedIndex, ShardedRetriever
+from .lexical import BM25Retriever, LexicalPrefilterRetriever
+from .utils import (
+    build_vector_retriever, BiasedRetriever,
+    SOURCES, source_of, to_documents, empty_vector_index, insert_documents,
+)
 
 def build_all_retrievers(
     docs_rows: List[Dict[str, Any]],
@@ -12,8 +21,107 @@ def build_all_retrievers(
     blogs_vec  = build_vector_retriever(blogs_rows,  top_k=top_k)
 
     retrievers = [
-        BiasedRetriever(docs_vec),
-        BiasedRetriever(forums_vec),
-        BiasedRetriever(blogs_vec),
+        BiasedRetriever(docs_vec,   name="docs"),
+        BiasedRetriever(forums_vec, name="forums"),
+        BiasedRetriever(blogs_vec,  name="blogs"),
     ]
     return retrievers
+
+def _enforce_budget(mem_budget, batch_size: int, embed_pool=None) -> int:
+    """Over the memory budget: halve the index batch and the embedding batch; returns the new index batch."""
+    if mem_budget is None or not mem_budget.over():
+        return batch_size
+    if embed_pool is not None:
+        embed_pool.batch_size = mem_budget.shrink("embed batch", embed_pool.batch_size)
+    elif hasattr(Settings.embed_model, "embed_batch_size"):
+        Settings.embed_model.embed_batch_size = mem_budget.shrink("embed batch", Settings.embed_model.embed_batch_size)
+    return mem_budget.shrink("index batch", batch_size)
+
+def _route_rows(rows: Iterable[Dict[str, Any]], batch_size: int, flush, embed_pool=None, mem_budget=None):
+    """Buffer rows per source and hand full batches to flush(src, rows); the budget is checked after each."""
+    bufs = {s: [] for s in SOURCES}
+    for r in rows:
+        src = source_of(r)
+        if r.get("source") != src:
+            r = dict(r, source=src)
+        bufs[src].append(r)
+        if len(bufs[src]) >= batch_size:
+            flush(src, bufs[src])
+            bufs[src] = []
+            batch_size = _enforce_budget(mem_budget, batch_size, embed_pool)
+    for s in SOURCES:
+        if bufs[s]:
+            flush(s, bufs[s])
+
+def build_all_retrievers_streaming(
+    rows: Iterable[Dict[str, Any]],
+    top_k: int = 30,
+    batch_size: int = 256,
+    embed_pool=None,
+    mem_budget=None,
+):
+    """
+    Same retrievers as build_all_retrievers, but fed from a row iterator:
+    rows are routed to their source's index and embedded in batches of batch_size,
+    so peak memory outside the indexes is bounded by 3 * batch_size chunks.
+    embed_pool: optional src.embedding.pool.EmbeddingPool to embed each batch across processes.
+    mem_budget: optional src.telemetry.memory.MemoryBudget; over it, batches shrink.
+    """
+    indexes = {s: empty_vector_index() for s in SOURCES}
+
+    def flush(src, batch):
+        with mem_stage("to_documents"):
+            docs = to_documents(batch)
+        with mem_stage("index_build"):
+            insert_documents(indexes[src], docs, embed_pool)
+
+    _route_rows(rows, batch_size, flush, embed_pool, mem_budget)
+    return [BiasedRetriever(indexes[s].as_retriever(similarity_top_k=top_k), name=s) for s in SOURCES]
+
+def build_sharded_retrievers(
+    rows: Iterable[Dict[str, Any]],
+    shards: int,
+    top_k: int = 30,
+    batch_size: int = 256,
+    embed_pool=None,
+    mem_budget=None,
+):
+    """
+    build_all_retrievers_streaming, but the vectors live in `shards` worker processes
+    (src/fusion/sharded.py): each batch is parsed and embedded here, then hash-routed
+    to the shards. Returns (retrievers, index); call index.close() when done.
+    """
+    index = ShardedIndex(shards)
+    if mem_budget is not None:
+        mem_budget.watch(index.pids)  # the vectors grow in the shards, not here
+
+    def flush(src, batch):
+        with mem_stage("to_documents"):
+            docs = to_documents(batch)
+        with mem_stage("index_build"):
+            nodes = run_transformations(docs, Settings.transformations)
+            if embed_pool is not None:
+                embed_pool.embed_nodes(nodes)
+            else:
+                texts = [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes]
+                for n, v in zip(nodes, Settings.embed_model.get_text_embedding_batch(texts)):
+                    n.embedding = v
+            index.add_nodes(src, nodes)
+
+    _route_rows(rows, batch_size, flush, embed_pool, mem_budget)
+    retrievers = [BiasedRetriever(ShardedRetriever(index, s, similarity_top_k=top_k, sources=SOURCES), name=s)
+                  for s in SOURCES]
+    return retrievers, index
+
+def add_lexical(retrievers: List, bm25, mode: str = "fuse", top_k: int = 30, top_m: int = 200) -> List:
+    """
+    mode="fuse": append a BM25 retriever (named "bm25") as a fourth fused source.
+    mode="prefilter": each source's dense retriever only scores that source's lexical top_m chunks.
+    """
+    if mode == "fuse":
+        return list(retrievers) + [BiasedRetriever(BM25Retriever(bm25, similarity_top_k=top_k), name="bm25")]
+    if mode == "prefilter":
+        for r in retrievers:
+            r.base = LexicalPrefilterRetriever(r.base, bm25, source=r.name, top_m=top_m)
+        return list(retrievers)
+    raise ValueError(f"unknown lexical mode {mode!r}")
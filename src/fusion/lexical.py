@@ -0,0 +1,75 @@
+# src/fusion/lexical.py
+"""
+The BM25 index (src/store/bm25_index.py) in the query path, two ways:
+
+- BM25Retriever: a fourth retriever next to the three dense ones, fused by the same
+  QueryFusionRetriever. Its nodes carry the same text + metadata as the dense nodes of
+  the chunk, so a chunk found by both is merged by fusion, not duplicated.
+- LexicalPrefilterRetriever: wraps one source's dense retriever and computes cosine
+  similarity only for the vectors of that source's lexical top-M chunks, instead of
+  every vector of the source. A query without any lexical hit falls back to the full
+  dense scan.
+"""
+from __future__ import annotations
+from typing import Dict, List
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from src.store.bm25_index import BM25Index
+from src.telemetry.stats import incr
+from .utils import row_to_document, source_of
+
+
+def node_from_row(r) -> TextNode:
+    """The node the dense index would hold for this chunk (same hash, so fusion merges them)."""
+    doc = row_to_document(dict(r, source=source_of(r)))
+    return TextNode(id_=doc.metadata["id"], text=doc.text, metadata=doc.metadata,
+                    excluded_embed_metadata_keys=doc.excluded_embed_metadata_keys,
+                    excluded_llm_metadata_keys=doc.excluded_llm_metadata_keys)
+
+
+class BM25Retriever:
+    def __init__(self, index: BM25Index, similarity_top_k: int = 30):
+        self.index = index
+        self.similarity_top_k = similarity_top_k
+
+    def retrieve(self, query) -> List[NodeWithScore]:
+        q = query.query_str if isinstance(query, QueryBundle) else query
+        hits = self.index.search(q, self.similarity_top_k)
+        rows = self.index.rows([d for d, _ in hits])
+        return [NodeWithScore(node=node_from_row(r), score=sc) for r, (_, sc) in zip(rows, hits)]
+
+
+class LexicalPrefilterRetriever:
+    def __init__(self, base, index: BM25Index, source: str, top_m: int = 200):
+        store = getattr(base, "_vector_store", None)
+        if store is None or not hasattr(getattr(store, "data", None), "embedding_dict"):
+            raise ValueError("lexical prefilter needs in-process vector indexes (not --shards)")
+        self.base = base
+        self.index = index
+        self.source = source
+        self.top_m = top_m
+        self._emb = store.data.embedding_dict  # node id -> vector
+        self._docstore = base._docstore
+        # chunk id -> node ids (a chunk may have been split into several nodes)
+        self._by_chunk: Dict[str, List[str]] = {}
+        for nid, node in self._docstore.docs.items():
+            self._by_chunk.setdefault((node.metadata or {}).get("id"), []).append(nid)
+
+    def retrieve(self, query) -> List[NodeWithScore]:
+        qb = query if isinstance(query, QueryBundle) else QueryBundle(query_str=query)
+        hits = self.index.search(qb.query_str, self.top_m, source=self.source)
+        nids = [nid for d, _ in hits for nid in self._by_chunk.get(self.index.ids[d], ()) if nid in self._emb]
+        if not nids:
+            incr("lexical_fallbacks")
+            return self.base.retrieve(qb)
+        if qb.embedding is None:
+            qb.embedding = self.base._embed_model.get_agg_embedding_from_queries(qb.embedding_strs)
+        m = np.asarray([self._emb[n] for n in nids], dtype=np.float32)
+        q = np.asarray(qb.embedding, dtype=np.float32)
+        sims = (m @ q) / (np.linalg.norm(m, axis=1) * np.linalg.norm(q) + 1e-12)  # SimpleVectorStore cosine
+        top = np.argsort(-sims, kind="stable")[:self.base._similarity_top_k]
+        incr("dense_scored", len(nids))
+        nodes = self._docstore.get_nodes([nids[i] for i in top])
+        return [NodeWithScore(node=n, score=float(sims[i])) for n, i in zip(nodes, top)]
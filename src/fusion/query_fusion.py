@@ -1,10 +1,63 @@
-from typing import List
+from typing import List, Optional
 from llama_index.core.retrievers import QueryFusionRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from src.telemetry.tracing import span
+from src.telemetry.stats import current_stats
+from src.telemetry.memory import mem_stage
 
-def build_fusion_engine(retrievers: List, per_source_top_k: int = 10, reranker=None):
+class TracedFusionRetriever(QueryFusionRetriever):
+    """QueryFusionRetriever with a "fusion" span around the per-source retrieves + fusion.
+    With `adaptive` (an AdaptiveK) each source's list is cut before fusion; the kept k per
+    source is reported into the query stats either way."""
+    adaptive = None
+
+    def _run_sync_queries(self, queries: List[QueryBundle]):
+        results = super()._run_sync_queries(queries)
+        names = {key: getattr(self._retrievers[key[1]], "name", str(key[1])) for key in results}
+        if self.adaptive is not None:
+            cut = self.adaptive.cut({names[key]: nodes for key, nodes in results.items()})
+            results = {key: cut[names[key]] for key in results}
+        st = current_stats()
+        if st is not None:
+            st["k_per_source"] = {names[key]: len(nodes) for key, nodes in results.items()}
+        return results
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with span("fusion", mode=str(self.mode)) as s:
+            nodes = super()._retrieve(query_bundle)
+            if s is not None:
+                s.set(n=len(nodes))
+        return nodes
+
+class TracedPostprocessor(BaseNodePostprocessor):
+    """Wrap a node postprocessor (e.g. the cross-encoder) in a named span."""
+    inner: BaseNodePostprocessor
+    stage: str = "postprocess"
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TracedPostprocessor"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        with span(self.stage, n_in=len(nodes)) as s, mem_stage(self.stage):
+            out = self.inner.postprocess_nodes(nodes, query_bundle=query_bundle)
+            if s is not None:
+                s.set(n_out=len(out))
+        return out
+
+def build_fusion_engine(retrievers: List, per_source_top_k: int = 10, reranker=None,
+                        collapse_budget: Optional[int] = None, adaptive=None):
+    """
+    adaptive: optional AdaptiveK; cuts each source's candidate list at its score elbow /
+    relative threshold (and caps the total) before fusion.
+    collapse_budget: if set (and reranking), adjacent windows of one file are merged under this
+    token budget before the cross-encoder, so rerank slots go to distinct evidence.
+    """
     # Pure fusion, no sub-query generation → no LLM involved
-    fusion = QueryFusionRetriever(
+    fusion = TracedFusionRetriever(
         retrievers=retrievers,
         similarity_top_k=per_source_top_k,  # Take top-K from each retriever before fusion
         num_queries=1,                      # Key: =1 so it won't trigger an LLM
@@ -12,13 +65,19 @@ def build_fusion_engine(retrievers: List, per_source_top_k: int = 10, reranker=N
         use_async=False,
         verbose=True,
     )
+    fusion.adaptive = adaptive
     # engine = RetrieverQueryEngine.from_args(fusion)
     # return engine
     if reranker is None:
         return RetrieverQueryEngine.from_args(fusion)
     else:
         # Attach the cross-encoder as a node postprocessor
+        post = []
+        if collapse_budget:
+            from src.rerank.sibling_collapse import SiblingCollapse
+            post.append(TracedPostprocessor(inner=SiblingCollapse(token_budget=collapse_budget), stage="collapse"))
+        post.append(TracedPostprocessor(inner=reranker, stage="rerank"))
         return RetrieverQueryEngine.from_args(
             fusion,
-            node_postprocessors=[reranker],
+            node_postprocessors=post,
         )
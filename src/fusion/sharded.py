@@ -0,0 +1,251 @@
+# src/fusion/sharded.py
+"""
+Sharded scatter-gather vector retrieval.
+
+Chunks are hash-partitioned (crc32 of the node id) over N shard worker processes; each
+shard keeps, per source, a row-normalized float32 matrix plus the node payloads, so the
+corpus no longer has to fit in (or be scanned by) the coordinating process. A query is
+embedded once, sent to every shard over its pipe, each shard answers with its per-source
+top-k by cosine, and the coordinator merges those into the global per-source top-k.
+
+ShardedRetriever exposes one source of that result with the VectorIndexRetriever
+interface, so the existing BiasedRetriever / build_fusion_engine path is unchanged. The
+three per-source retrievers of one query share a single scatter (memoized per QueryBundle).
+
+Requests carry ids and each shard's replies are read by its own thread, so concurrent
+queries (QueryService workers) are all in flight on the shards at once instead of taking
+turns on one coordinator lock.
+"""
+from __future__ import annotations
+import heapq
+import multiprocessing as mp
+import os
+import threading
+import weakref
+import zlib
+from concurrent.futures import Future
+from itertools import count
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+
+
+def _shard_main(conn):
+    """
+    Shard worker loop: ("add", source, vecs, nodes) / ("search", rid, q, top_k, sources) /
+    ("stats", rid) / ("close",). Replies are (rid, result).
+    """
+    pending: Dict[str, List[Tuple[np.ndarray, list]]] = {}
+    mats: Dict[str, np.ndarray] = {}
+    nodes: Dict[str, list] = {}
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        op = msg[0]
+        if op == "add":
+            _, src, vecs, ns = msg
+            pending.setdefault(src, []).append((vecs, ns))
+        elif op == "search":
+            _, rid, q, top_k, sources = msg
+            # Fold batches added since the last search into the per-source matrix
+            for src, parts in pending.items():
+                mats[src] = np.vstack(([mats[src]] if src in mats else []) + [v for v, _ in parts])
+                nodes[src] = nodes.get(src, []) + [n for _, ns in parts for n in ns]
+            pending.clear()
+            out = {}
+            for src in sources:
+                m = mats.get(src)
+                if m is None or not len(m):
+                    out[src] = []
+                    continue
+                sims = m @ q
+                k = min(top_k, len(sims))
+                idx = np.argpartition(-sims, k - 1)[:k]
+                out[src] = [(float(sims[i]), nodes[src][i]) for i in idx]
+            conn.send((rid, out))
+        elif op == "stats":
+            counts = {s: len(m) for s, m in mats.items()}
+            for s, parts in pending.items():
+                counts[s] = counts.get(s, 0) + sum(len(v) for v, _ in parts)
+            conn.send((msg[1], counts))
+        elif op == "close":
+            break
+    conn.close()
+
+
+def _normalize(vecs) -> np.ndarray:
+    m = np.asarray(vecs, dtype=np.float32)
+    if m.ndim == 1:
+        m = m[None, :]
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1.0, norms)
+
+
+class ShardedIndex:
+    """Coordinator over `shards` local worker processes; one scatter-gather per search()."""
+
+    def __init__(self, shards: int = 2, blas_threads: int = 1):
+        self.shards = max(1, shards)
+        self._rids = count()
+        self._waiting: Dict[int, Tuple[int, Future]] = {}  # rid -> (shard, reply future)
+        self._wait_lock = threading.Lock()
+        # Per-query scatter result, keyed by id(QueryBundle); the entry goes when the bundle does
+        self._memo: Dict[int, Tuple[weakref.ref, int, Dict[str, List[NodeWithScore]]]] = {}
+        # Shards pin their BLAS pools (inherited env is read when numpy loads in the child),
+        # so N shards x T threads never oversubscribes the box
+        saved = {k: os.environ.get(k) for k in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({k: str(blas_threads) for k in saved})
+        try:
+            ctx = mp.get_context("spawn")
+            self._conns, self._procs = [], []
+            for _ in range(self.shards):
+                parent, child = ctx.Pipe()
+                p = ctx.Process(target=_shard_main, args=(child,), daemon=True)
+                p.start()
+                child.close()
+                self._conns.append(parent)
+                self._procs.append(p)
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+        self._send_locks = [threading.Lock() for _ in self._conns]
+        self._dead = [False] * self.shards
+        self._readers = [threading.Thread(target=self._read_replies, args=(i,), name=f"shard-{i}-replies", daemon=True)
+                         for i in range(self.shards)]
+        for t in self._readers:
+            t.start()
+
+    @property
+    def pids(self) -> List[int]:
+        return [p.pid for p in self._procs]
+
+    def shard_of(self, node_id: str) -> int:
+        return zlib.crc32(node_id.encode("utf-8")) % self.shards
+
+    def add(self, source: str, vecs, nodes: Sequence) -> None:
+        """Route (vector, payload) pairs to their shards; vecs is (n, dim)."""
+        vecs = _normalize(vecs)
+        groups: Dict[int, List[int]] = {}
+        for i, n in enumerate(nodes):
+            nid = getattr(n, "node_id", None) or str(n)
+            groups.setdefault(self.shard_of(nid), []).append(i)
+        for s, idxs in groups.items():
+            self._send(s, ("add", source, vecs[idxs], [nodes[i] for i in idxs]))
+
+    def add_nodes(self, source: str, nodes: List[BaseNode]) -> None:
+        """Add embedded nodes; the embedding is shipped as a matrix row, not inside the payload."""
+        if not nodes:
+            return
+        vecs = [n.embedding for n in nodes]
+        payloads = [n.model_copy(update={"embedding": None}) for n in nodes]
+        self.add(source, vecs, payloads)
+
+    # ---- pipes: one send lock per shard, replies matched to requests by id ----
+    def _send(self, i: int, msg) -> None:
+        with self._send_locks[i]:
+            self._conns[i].send(msg)
+
+    def _request(self, i: int, op: str, *args) -> Future:
+        rid = next(self._rids)
+        fut: Future = Future()
+        with self._wait_lock:
+            if self._dead[i]:
+                raise RuntimeError(f"shard {i} died (exitcode={self._procs[i].exitcode})")
+            self._waiting[rid] = (i, fut)
+        try:
+            self._send(i, (op, rid) + args)
+        except (OSError, ValueError) as e:
+            with self._wait_lock:
+                self._waiting.pop(rid, None)
+            raise RuntimeError(f"shard {i} died (exitcode={self._procs[i].exitcode})") from e
+        return fut
+
+    def _read_replies(self, i: int):
+        conn = self._conns[i]
+        while True:
+            try:
+                rid, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._wait_lock:
+                _, fut = self._waiting.pop(rid, (None, None))
+            if fut is not None:
+                fut.set_result(result)
+        # Shard gone (or closed): fail whatever was still waiting on it
+        err = RuntimeError(f"shard {i} died (exitcode={self._procs[i].exitcode})")
+        with self._wait_lock:
+            self._dead[i] = True
+            dead = [rid for rid, (shard, _) in self._waiting.items() if shard == i]
+            futs = [self._waiting.pop(rid)[1] for rid in dead]
+        for fut in futs:
+            fut.set_exception(err)
+
+    def search(self, query_embedding, top_k: int, sources: Sequence[str]) -> Dict[str, List[Tuple[float, object]]]:
+        """Scatter the query to every shard, gather their per-source top-k, merge to the global top-k."""
+        q = _normalize(query_embedding)[0]
+        futs = [self._request(i, "search", q, top_k, tuple(sources)) for i in range(len(self._conns))]
+        parts = [f.result() for f in futs]
+        return {src: heapq.nlargest(top_k, (hit for p in parts for hit in p.get(src, [])), key=lambda h: h[0])
+                for src in sources}
+
+    def retrieve_all(self, qb: QueryBundle, top_k: int, sources: Sequence[str]) -> Dict[str, List[NodeWithScore]]:
+        """search() for a QueryBundle, memoized so the per-source retrievers of one query share it."""
+        key = id(qb)
+        entry = self._memo.get(key)
+        if entry is not None and entry[0]() is qb and entry[1] == top_k and all(s in entry[2] for s in sources):
+            memo = entry[2]
+            return {s: [NodeWithScore(node=n.node, score=n.score) for n in memo[s]] for s in sources}
+        if qb.embedding is None:
+            from llama_index.core.settings import Settings
+            qb.embedding = Settings.embed_model.get_agg_embedding_from_queries(qb.embedding_strs)
+        hits = self.search(qb.embedding, top_k, sources)
+        out = {s: [NodeWithScore(node=n, score=sc) for sc, n in hits[s]] for s in sources}
+        # No lock in the weakref callback: it may run from GC on any thread
+        self._memo[key] = (weakref.ref(qb, lambda _, k=key, memo=self._memo: memo.pop(k, None)), top_k, out)
+        return {s: [NodeWithScore(node=n.node, score=n.score) for n in out[s]] for s in sources}
+
+    def stats(self) -> List[Dict[str, int]]:
+        futs = [self._request(i, "stats") for i in range(len(self._conns))]
+        return [f.result() for f in futs]
+
+    def close(self):
+        for i, c in enumerate(self._conns):
+            try:
+                self._send(i, ("close",))
+            except (OSError, BrokenPipeError, ValueError):
+                pass
+        for p in self._procs:
+            p.join(timeout=5)
+        for t in self._readers:
+            t.join(timeout=5)
+        for c in self._conns:
+            c.close()
+        self._conns, self._procs, self._readers = [], [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ShardedRetriever:
+    """One source of a ShardedIndex, with the retrieve(QueryBundle) shape of a vector retriever."""
+
+    def __init__(self, index: ShardedIndex, source: str, similarity_top_k: int = 30,
+                 sources: Sequence[str] = ("docs", "forums", "blogs")):
+        self.index = index
+        self.source = source
+        self.similarity_top_k = similarity_top_k
+        self.sources = tuple(sources)
+
+    def retrieve(self, query) -> List[NodeWithScore]:
+        qb = query if isinstance(query, QueryBundle) else QueryBundle(query_str=query)
+        return self.index.retrieve_all(qb, self.similarity_top_k, self.sources)[self.source]
@@ -0,0 +1,155 @@
+# src/fusion/snapshot.py
+"""
+Versioned index snapshots that can be swapped in a running process.
+
+An IndexSnapshot is one complete set of per-source retrievers (what
+build_all_retrievers* / build_sharded_retrievers return) plus the version of the chunk
+artifact it was built from, and any other per-corpus state derived from that artifact
+(`extras`, e.g. the reranker's passage token cache), so it is swapped with the index.
+SnapshotManager holds the live one:
+
+- pin() marks the start of a query: it takes a reference on the current snapshot and
+  makes it the snapshot every SnapshotRetriever sees for the rest of that query (a
+  ContextVar, so it follows copy_context() into worker threads);
+- swap() replaces the live snapshot atomically; queries already pinned finish on the
+  old one, which is released (close() + references dropped) when its last pin ends;
+- load_async() builds the next snapshot on a background thread and swaps it in when
+  ready, so a corpus refresh never blocks queries.
+"""
+from __future__ import annotations
+import gc
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_PINNED: ContextVar[Optional["IndexSnapshot"]] = ContextVar("index_snapshot", default=None)
+
+
+def current_snapshot() -> Optional["IndexSnapshot"]:
+    """The snapshot pinned by the running query, if any."""
+    return _PINNED.get()
+
+
+class IndexSnapshot:
+    def __init__(self, version: str, retrievers: Dict[str, object], close: Optional[Callable[[], None]] = None,
+                 extras: Optional[Dict[str, Any]] = None):
+        self.version = version
+        self.retrievers = dict(retrievers)  # source name -> retriever
+        self.extras = dict(extras or {})    # name -> per-corpus state built with the retrievers
+        self.created = time.time()
+        self._close = close
+        self._refs = 0
+        self._retired = False
+        self.released = False
+
+    def release(self):
+        """Free the snapshot's indexes (shard processes, vector stores)."""
+        if self.released:
+            return
+        self.released = True
+        if self._close is not None:
+            self._close()
+        self.retrievers = {}
+        self.extras = {}
+        gc.collect()  # index objects hold reference cycles; don't wait for the next automatic pass
+
+    def __repr__(self):
+        return f"IndexSnapshot(version={self.version!r}, refs={self._refs}, released={self.released})"
+
+
+class SnapshotManager:
+    def __init__(self, snapshot: IndexSnapshot):
+        self._lock = threading.Lock()
+        self._current = snapshot
+        self._loader: Optional[ThreadPoolExecutor] = None
+        self.swaps = 0
+
+    @property
+    def current(self) -> IndexSnapshot:
+        return self._current
+
+    @property
+    def version(self) -> str:
+        return self._current.version
+
+    @contextmanager
+    def pin(self) -> Iterator[IndexSnapshot]:
+        pinned = _PINNED.get()
+        if pinned is not None:  # nested pin (e.g. ask() inside a service call): keep the outer one
+            yield pinned
+            return
+        with self._lock:
+            snap = self._current
+            snap._refs += 1
+        token = _PINNED.set(snap)
+        try:
+            yield snap
+        finally:
+            _PINNED.reset(token)
+            with self._lock:
+                snap._refs -= 1
+                free = snap._retired and snap._refs == 0
+            if free:
+                # The query that drops the last pin should not pay for freeing the index
+                threading.Thread(target=snap.release, name="index-release", daemon=True).start()
+
+    def swap(self, snapshot: IndexSnapshot) -> IndexSnapshot:
+        """Make `snapshot` live; returns the previous one (released now or when its last query ends)."""
+        with self._lock:
+            old, self._current = self._current, snapshot
+            old._retired = True
+            free = old._refs == 0
+            self.swaps += 1
+        print(f"[INDEX] swapped {old.version} -> {snapshot.version}"
+              f"{'' if free else f' ({old._refs} queries still on {old.version})'}")
+        if free:
+            old.release()
+        return old
+
+    def load_async(self, build: Callable[[], IndexSnapshot]) -> Future:
+        """Build the next snapshot off the query path and swap it in; a failed build leaves the live one."""
+        if self._loader is None:
+            self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-load")
+
+        def _load():
+            return self.swap(build())
+        return self._loader.submit(_load)
+
+    def watch(self, version_of: Callable[[], str], build: Callable[[], IndexSnapshot],
+              interval: float = 30.0) -> threading.Event:
+        """Poll `version_of()` every `interval` s and load_async(build) when it changes; set the event to stop."""
+        stop = threading.Event()
+
+        def _poll():
+            while not stop.wait(interval):
+                try:
+                    v = version_of()
+                except OSError:
+                    continue  # artifact mid-rewrite; try again next tick
+                if v != self._current.version:
+                    try:
+                        self.load_async(build).result()
+                    except Exception as e:  # keep serving the live snapshot; retried on the next tick
+                        print(f"[WARN] index reload to {v} failed: {type(e).__name__}: {e}")
+        threading.Thread(target=_poll, name="index-watch", daemon=True).start()
+        return stop
+
+    def close(self):
+        if self._loader is not None:
+            self._loader.shutdown(wait=True)
+        self._current.release()
+
+
+class SnapshotRetriever:
+    """Per-source retriever that resolves to the query's pinned snapshot (or the live one)."""
+
+    def __init__(self, manager: SnapshotManager, name: str):
+        self.manager = manager
+        self.name = name
+
+    def retrieve(self, query):
+        snap = _PINNED.get() or self.manager.current
+        return snap.retrievers[self.name].retrieve(query)
@@ -1,29 +1,68 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterable, Iterator
 from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.ingestion import run_transformations
 from llama_index.core.schema import NodeWithScore
 from llama_index.core.settings import Settings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 import json
 import hashlib
+import os
+from src.telemetry.tracing import span
+from src.telemetry.memory import mem_stage
+from src.store.chunk_store import ChunkStore
+from src.chunking.dedup import DUP_KEY
+from src.graphrag.scorer import static_priors, PRIOR_KEYS
 
-# ------- Global: disable LLM, use local open-source embeddings (won't trigger OpenAI) -------
-Settings.llm = None
-Settings.embed_model = HuggingFaceEmbedding(model_name="intfloat/e5-small-v2")  # CPU OK
+# Settings.llm / Settings.embed_model are set by the entry points (main.py, eval/eval.py), not at
+# import: spawned embedding workers and shard processes re-import main and this module, and must
+# not each load torch and a copy of the model.
 
 # ------- Data utilities -------
-def load_rows_from_jsonl(path: str) -> List[Dict[str, Any]]:
-    rows = []
+SOURCES = ("docs", "forums", "blogs")
+
+def iter_rows_from_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream rows one line at a time; memory stays constant regardless of file size."""
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
-            rows.append(json.loads(line))
-    return rows
+            yield json.loads(line)
+
+def load_rows_from_jsonl(path: str) -> List[Dict[str, Any]]:
+    return list(iter_rows_from_jsonl(path))
+
+def load_chunks(path: str):
+    """A ChunkStore if `path` is a columnar store directory, else the rows of a chunks.jsonl."""
+    if ChunkStore.is_store(path):
+        return ChunkStore(path)
+    return load_rows_from_jsonl(path)
+
+def artifact_version(path: str) -> str:
+    """Cheap fingerprint of a chunk artifact (chunks.jsonl or a columnar store dir): path + size + mtime."""
+    target = os.path.join(path, "manifest.json") if ChunkStore.is_store(path) else path
+    st = os.stat(target)
+    raw = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+def iter_chunk_rows(path: str) -> Iterator[Dict[str, Any]]:
+    if ChunkStore.is_store(path):
+        store = ChunkStore(path)
+        # Prior columns ride along so row_to_document does not re-parse timestamps
+        extra = tuple(c for c in ("timestamp", "src_prior") if c in store.manifest["num_columns"])
+        return store.iter_rows(("id", "source", "text", "meta") + extra)
+    return iter_rows_from_jsonl(path)
+
+def source_of(r: Dict[str, Any]) -> str:
+    """Normalized source name; unknown sources default to docs to avoid data loss."""
+    src = (r.get("source") or "").lower()
+    return src if src in SOURCES else "docs"
 
 def partition_rows_by_source(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]],
                                                                    List[Dict[str, Any]],
                                                                    List[Dict[str, Any]]]:
+    if isinstance(rows, ChunkStore):
+        # Store rows are grouped by source: each partition is a zero-copy slice
+        return rows.partition_by_source()
     docs_rows, forums_rows, blogs_rows = [], [], []
     for r in rows:
         src = (r.get("source") or "").lower()
@@ -40,42 +79,74 @@ def partition_rows_by_source(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str,
             docs_rows.append(rr)
     return docs_rows, forums_rows, blogs_rows
 
-def to_documents(rows: List[Dict[str, Any]]) -> List[Document]:
-    docs = []
+def row_to_document(r: Dict[str, Any]) -> Document:
+    meta = {"source": r.get("source", "docs")}
+    if r.get("meta"):
+        meta.update(r["meta"])
+    # ---- Generate/fallback chunk id (stable & traceable) ----
+    cid = r.get("id") or meta.get("id")
+    if not cid:
+        cid = hashlib.md5(r["text"].encode("utf-8")).hexdigest()[:10]
+    meta["id"] = cid
+    # Static evidence priors (timestamp, source prior) computed once here, not per query
+    meta.update(static_priors(r))
+    # Provenance of collapsed near-duplicates and the priors stay out of the embedded / LLM-visible text
+    hidden = list(PRIOR_KEYS) + ([DUP_KEY] if DUP_KEY in meta else [])
+    return Document(text=r["text"], metadata=meta,
+                    excluded_embed_metadata_keys=hidden, excluded_llm_metadata_keys=hidden)
+
+def iter_documents(rows: Iterable[Dict[str, Any]]) -> Iterator[Document]:
     for r in rows:
-        meta = {"source": r.get("source", "docs")}
-        if r.get("meta"):
-            meta.update(r["meta"])
-        # ---- Generate/fallback chunk id (stable & traceable) ----
-        cid = r.get("id") or meta.get("id")
-        if not cid:
-            cid = hashlib.md5(r["text"].encode("utf-8")).hexdigest()[:10]
-        meta["id"] = cid
-        docs.append(Document(text=r["text"], metadata=meta))
-    return docs
+        yield row_to_document(r)
+
+def to_documents(rows: List[Dict[str, Any]]) -> List[Document]:
+    return list(iter_documents(rows))
 
 # ------- Retriever construction (vector-only) -------
 def build_vector_retriever(rows: List[Dict[str, Any]], top_k: int = 30):
-    docs = to_documents(rows)
-    index = VectorStoreIndex.from_documents(docs, embed_model=Settings.embed_model)
+    with mem_stage("to_documents"):
+        docs = to_documents(rows)
+    with mem_stage("index_build"):
+        index = VectorStoreIndex.from_documents(docs, embed_model=Settings.embed_model)
     return index.as_retriever(similarity_top_k=top_k)
 
+def empty_vector_index() -> VectorStoreIndex:
+    return VectorStoreIndex(nodes=[], embed_model=Settings.embed_model)
+
+def insert_documents(index: VectorStoreIndex, docs: List[Document], embed_pool=None):
+    """
+    Parse + embed + store one batch (same transformations from_documents would apply).
+    With an EmbeddingPool the vectors are computed by its worker processes; nodes that
+    already carry an embedding are stored as-is by the index.
+    """
+    nodes = run_transformations(docs, Settings.transformations)
+    if embed_pool is not None:
+        embed_pool.embed_nodes(nodes)
+    index.insert_nodes(nodes)
+
 # ------- Lightweight weighting at recall stage (docs > forums > blogs, adjustable) -------
 SOURCE_WEIGHT = {"docs": 1.0, "forums": 0.88, "blogs": 0.75}
 FORUM_PRIOR   = 0.05  # Forum prior; set to 0 if undesired
 
 def apply_source_bias(nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+    # New NodeWithScore wrappers: the retriever's objects may be shared (index-owned, memoized)
+    out = []
     for n in nodes:
         src = (n.node.metadata or {}).get("source", "")
         base = n.score or 0.0
         w = SOURCE_WEIGHT.get(src, 1.0)
         bonus = FORUM_PRIOR if src == "forums" else 0.0
-        n.score = base * w + bonus
-    return sorted(nodes, key=lambda x: x.score or 0.0, reverse=True)
+        out.append(NodeWithScore(node=n.node, score=base * w + bonus))
+    return sorted(out, key=lambda x: x.score or 0.0, reverse=True)
 
 class BiasedRetriever:
     """Apply source weighting on top of the base vector retriever; only a light bias at the recall stage."""
-    def __init__(self, base_retriever):
+    def __init__(self, base_retriever, name: str = "vector"):
         self.base = base_retriever
+        self.name = name
     def retrieve(self, query: str) -> List[NodeWithScore]:
-        return apply_source_bias(self.base.retrieve(query))
+        with span(f"retrieve.{self.name}") as s:
+            nodes = apply_source_bias(self.base.retrieve(query))
+            if s is not None:
+                s.set(n=len(nodes))
+        return nodes
@@ -0,0 +1,151 @@
+# src/graphrag/extract_rules.py
+"""
+Rule-based claim extraction fast path.
+
+Most config claims in the corpus are pattern-shaped ("batch_size=32", "patience: 5",
+"--lr-scheduler cosine", "60-day artifact retention", "metrics at 10s granularity").
+All forms are compiled into ONE alternation regex, so a chunk is a single finditer
+pass; matches become the same {"key","val","sent"} dicts as extract_claims_llm_open,
+with canonical keys (param.*) and values normalized via open_canon.normalize_value.
+
+extract_claims_fast() only falls back to the LLM when the rules find nothing AND
+looks_config_like() says the chunk still reads like configuration text. Rule hits,
+LLM calls and LLM calls avoided are counted in the query stats.
+"""
+from __future__ import annotations
+import os
+import re
+from typing import Dict, List, Tuple
+
+from .open_canon import normalize_value
+from src.telemetry.stats import incr
+
+# canonical key -> (key-name aliases as regex, value kind, enum values that may precede the key)
+KEY_SPECS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "param.batch_size": (r"batch[_\s-]?size", "count", ()),
+    "param.concurrency": (r"concurrency", "count", ()),
+    "param.timeout": (r"timeouts?(?:_s|_seconds)?", "time", ()),
+    "param.retries": (r"(?:max[_\s-]?)?retries", "count", ()),
+    "param.early_stopping.patience": (r"(?:early[_\s-]stopping[_\s-])?patience", "count", ()),
+    "param.lr_scheduler": (r"(?:lr[_\s-]?)?scheduler", "enum", ("cosine", "step", "linear", "constant")),
+    # bare "artifacts" only counts in the keep/retain form and "artifacts: N days" (see _build)
+    "param.artifact_retention_days": (r"artifact[_\s-]?retention(?:[_\s-]days)?", "days", ()),
+    "param.metrics.granularity": (r"(?:metrics[_\s-]?)?(?:granularity|window)s?", "time", ()),
+}
+
+# Whole numbers only: "3e-5", "5-10" and "1.2.3" must not yield "3" / "5" / "1.2"
+_NUM = r"\d+(?:\.\d+)?(?![eE][-+]?\d|-\d|\.\d|\d)"
+_UNIT = r"(?:ms|milliseconds?|s|secs?|seconds?|days?|d)\b"
+_ENUM = r"[a-z][a-z0-9_-]*"
+
+
+def _build() -> re.Pattern:
+    # One alternation per surface form (not per key x form) so each position tries only a few
+    # branches; the key is recovered from whichever k<i> group matched.
+    keys = "|".join(f"(?P<k{i}>{alias})" for i, (alias, _, _) in enumerate(KEY_SPECS.values()))
+    num = rf"{_NUM}\s*-?\s*(?:{_UNIT})?"
+    timed = "|".join(alias for alias, kind, _ in KEY_SPECS.values() if kind in ("time", "days"))
+    enums = "|".join(e for _, _, pre in KEY_SPECS.values() for e in pre)
+    return re.compile(
+        # key=val / key: val / "key": val ; "key 32", "key of 32", "key is 30s", "key set to 3"
+        rf"\b(?:{keys})(?:\"?\s*[:=]\s*\"?(?P<sep>{num}|{_ENUM})"
+        rf"|\s+(?:is\s+|of\s+|to\s+|set\s+to\s+|at\s+)?(?P<prose>{num}))"
+        # --key val / --key=val
+        rf"|--(?:{keys.replace('(?P<k', '(?P<c')})(?:\s+|=)(?P<cli>{num}|{_ENUM})"
+        # "60-day artifact retention", "10s granularity", "30-second windows"
+        rf"|\b(?P<pre>{_NUM}\s*-?\s*{_UNIT})\s+(?P<timed>{timed})\b"
+        # "step scheduler", "cosine lr scheduler"
+        rf"|\b(?P<enum>{enums})\s+(?P<enumkey>(?:lr[_\s-]?)?scheduler)\b"
+        # "we keep artifacts for 60 days", "artifacts are retained for 30 days"
+        rf"|\b(?:(?:keep|retain)s?\s+artifacts?|artifacts?\s+(?:are\s+)?(?:kept|retained))"
+        rf"\s+for\s+(?P<keep>{_NUM}\s*-?\s*days?)\b"
+        # "keep 60-day artifacts"; "artifacts: 60 days" (a bare "artifacts" needs the day unit)
+        rf"|\b(?:keep|retain)s?\s+(?P<keepadj>{_NUM}\s*-?\s*days?)\s+artifacts?\b"
+        rf"|\bartifacts\"?\s*[:=]\s*\"?(?P<keepkv>{_NUM}\s*-?\s*(?:days?|d)\b)",
+        re.I)
+
+
+_RULES = _build()
+_KEYS = list(KEY_SPECS)
+_ALIAS = [re.compile(rf"(?:{alias})$", re.I) for alias, _, _ in KEY_SPECS.values()]
+_VAL = re.compile(rf"^({_NUM})\s*-?\s*((?:ms|milliseconds?|s|secs?|seconds?|days?|d))?$", re.I)
+
+# cheap "is there config in here at all" signals for the LLM fallback gate
+_CONFIG_LIKE = re.compile(
+    r"\b[a-z]+(?:_[a-z0-9]+)*\"?\s*[:=]\s*\"?\w"   # key: value / key=value / "key": value
+    r"|--[a-z][a-z-]+\s+\S"                       # CLI flag with an argument
+    r"|\b\d+(?:\.\d+)?\s*-?\s*(?:ms|s|sec|seconds?|minutes?|days?|gb|mb)\b"
+    r"|\b(?:default(?:s)?|set\s+to|limit(?:ed)?\s+to|max(?:imum)?|min(?:imum)?)\b[^.\n]{0,40}\d",
+    re.I)
+
+
+def _normalize(key: str, raw: str) -> str:
+    kind = KEY_SPECS[key][1]
+    m = _VAL.match(raw.strip())
+    if not m:
+        return normalize_value(raw)
+    num, unit = m.group(1), (m.group(2) or "").lower()
+    if kind == "days" or unit.startswith("d"):
+        return num
+    if kind == "time" or unit:
+        return normalize_value(f"{num}{'ms' if unit.startswith('m') else 's'}")
+    return num  # counts stay bare (normalize_value would read "32" as "32s")
+
+
+_SENT_BREAKS = (". ", "! ", "? ", "\n")  # "v2.1" / "3e-5" are not sentence ends
+
+
+def _sentence(text: str, start: int, end: int) -> str:
+    a = max(text.rfind(c, 0, start) + len(c) for c in _SENT_BREAKS)
+    ends = [p for p in (text.find(c, end) for c in _SENT_BREAKS) if p != -1]
+    b = min(ends) + 1 if ends else len(text)
+    return text[max(a, 0):b].strip()
+
+
+def extract_claims_rules(text: str) -> List[Dict]:
+    if not text:
+        return []
+    out, seen = [], set()
+    for m in _RULES.finditer(text):
+        d = m.groupdict()
+        if d["keep"] or d["keepadj"] or d["keepkv"]:
+            key, raw = "param.artifact_retention_days", d["keep"] or d["keepadj"] or d["keepkv"]
+        elif d["pre"] or d["enum"]:
+            word = d["timed"] or d["enumkey"]
+            key = next(k for k, a in zip(_KEYS, _ALIAS) if a.match(word))
+            raw = d["pre"] or d["enum"]
+        else:
+            i = next(i for i in range(len(_KEYS)) if d[f"k{i}"] or d[f"c{i}"])
+            key, raw = _KEYS[i], d["sep"] or d["prose"] or d["cli"]
+            if (KEY_SPECS[key][1] == "enum") == bool(_VAL.match(raw.strip())):
+                continue  # "scheduler: 5" / "patience: high" — value of the wrong kind
+        val = _normalize(key, raw)
+        sent = _sentence(text, m.start(), m.end())
+        if (key, val, sent) not in seen:
+            seen.add((key, val, sent))
+            out.append({"key": key, "val": val, "sent": sent})
+    return out
+
+
+def looks_config_like(text: str) -> bool:
+    return bool(text) and _CONFIG_LIKE.search(text) is not None
+
+
+def extract_claims_fast(text: str, model: str = None) -> List[Dict]:
+    """Rules first; the LLM only for rule misses that still look like config text.
+    EXTRACT_MODE=rules disables the LLM entirely, EXTRACT_MODE=llm restores the old path."""
+    mode = os.getenv("EXTRACT_MODE", "rules+llm")
+    if not text or not text.strip():
+        return []
+    if mode != "llm":
+        claims = extract_claims_rules(text)
+        if claims:
+            incr("claims_rule_hits")
+            incr("claims_llm_avoided")
+            return claims
+        if mode == "rules" or not looks_config_like(text):
+            incr("claims_llm_avoided")
+            return []
+    from .extract_llm_open import extract_claims_llm_open
+    incr("claims_llm_calls")
+    return extract_claims_llm_open(text, model=model)
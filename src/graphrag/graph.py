@@ -3,9 +3,11 @@ from typing import List, Dict, Any, Tuple, DefaultDict
 from collections import defaultdict
 import networkx as nx
 # from .extract import extract_claims
-from .scorer import evidence_weight
+from .scorer import evidence_weight, evidence_weights, source_prior, PRIOR_SRC
 from .open_canon import cluster_keys  # ← added
-from .extract_llm_open import extract_claims_llm_open as extract_claims
+# Rules first; extract_claims_llm_open only for rule misses that look config-like (EXTRACT_MODE=llm for LLM-only)
+from .extract_rules import extract_claims_fast as extract_claims
+from src.chunking.dedup import DUP_KEY
 
 def _cid(meta: Dict[str, Any]) -> str:
     return f"{(meta.get('source') or 'src')}::{(meta.get('id') or 'chunk')}"
@@ -13,6 +15,15 @@ def _cid(meta: Dict[str, Any]) -> str:
 def _claim_node(key: str, val: str) -> str:
     return f"claim::{key}={val}"
 
+def _evidence_metas(meta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The chunk itself plus every near-duplicate collapsed into it at index time (same text, own provenance)."""
+    members = meta.get(DUP_KEY) or []
+    if not members:
+        return [meta]
+    base = {k: v for k, v in meta.items() if k != DUP_KEY}
+    return [base] + [dict(base, source=m.get("source"), id=m.get("id"), **{PRIOR_SRC: source_prior(m.get("source"))})
+                     for m in members]
+
 class ClaimGraph:
     def __init__(self):
         self.G = nx.DiGraph()
@@ -52,18 +63,22 @@ class ClaimGraph:
 
         self.add_contradictions()
 
-    def add_evidence(self, node_text: str, meta: Dict[str, Any], base_score: float):
-        """Extract claims from one evidence (chunk) and link edges."""
-        evid_id = _cid(meta)
-        self.G.add_node(evid_id, type="evidence", **meta)
+    def add_evidence(self, node_text: str, meta: Dict[str, Any], base_score: float, weights=None):
+        """Extract claims from one evidence (chunk) and link edges; collapsed duplicates each get their own support edge.
+        weights: precomputed evidence weights aligned with _evidence_metas(meta) (see build_from_nodes)."""
+        metas = _evidence_metas(meta)
+        if weights is None:
+            weights = evidence_weights(metas, [base_score] * len(metas))
+        for em in metas:
+            self.G.add_node(_cid(em), type="evidence", **em)
 
         claims = extract_claims(node_text)
         for c in claims:
             c_id = _claim_node(c["key"], c["val"])
             if not self.G.has_node(c_id):
                 self.G.add_node(c_id, type="claim", key=c["key"], val=c["val"])
-            w = evidence_weight(meta, base_score)
-            self.G.add_edge(evid_id, c_id, type="supports", weight=float(w), sent=c["sent"])
+            for em, w in zip(metas, weights):
+                self.G.add_edge(_cid(em), c_id, type="supports", weight=float(w), sent=c["sent"])
 
     def add_contradictions(self):
         """For the same key with different values, link pairwise 'contradicts' edges."""
@@ -87,13 +102,20 @@ class ClaimGraph:
                             self.G.add_edge(na, nb, type="contradicts")
                             self.G.add_edge(nb, na, type="contradicts")
 
-    def build_from_nodes(self, nodes: List[Any]):
-        """nodes: a list of LlamaIndex NodeWithScore."""
+    def build_from_nodes(self, nodes: List[Any], now: float = None):
+        """nodes: a list of LlamaIndex NodeWithScore. Evidence weights for the whole set are one
+        vectorized call against a single `now`."""
+        items = []
         for n in nodes:
             meta = (n.metadata or {})
             text = getattr(n, "text", None) or getattr(getattr(n, "node", None), "text", "") or ""
-            base = n.score or 0.0
-            self.add_evidence(text, meta, base)
+            items.append((text, meta, n.score or 0.0, len(_evidence_metas(meta))))
+        weights = evidence_weights([em for _, meta, _, _ in items for em in _evidence_metas(meta)],
+                                   [base for _, _, base, k in items for _ in range(k)], now=now)
+        i = 0
+        for text, meta, base, k in items:
+            self.add_evidence(text, meta, base, weights=weights[i:i + k])
+            i += k
         self.add_contradictions()
 
     # ---- Adjudication & reporting ----
@@ -1,22 +1,62 @@
 # Edge weight from evidence to claim: fusion score / source weight / freshness (no LLM)
 from __future__ import annotations
-from typing import Dict, Any
-from datetime import datetime
-from dateutil import parser as dtparser
+import time
+from typing import Dict, Any, Optional, Sequence
+import numpy as np
+from src.store.chunk_store import parse_ts, row_timestamp, TS_MISSING
 
 SOURCE_WEIGHT = {"docs": 1.0, "forums": 0.88, "blogs": 0.75}
+_SW_MIN, _SW_MAX = min(SOURCE_WEIGHT.values()), max(SOURCE_WEIGHT.values())
+# Normalized to 0–1 once, not per support edge; unknown sources count as weight 1.0
+SOURCE_PRIOR = {s: (w - _SW_MIN) / ((_SW_MAX - _SW_MIN) or 1.0) for s, w in SOURCE_WEIGHT.items()}
+_UNKNOWN_PRIOR = (1.0 - _SW_MIN) / ((_SW_MAX - _SW_MIN) or 1.0)
+
+# Static per-chunk priors, filled into (hidden) node metadata at index time
+PRIOR_TS = "_ts"           # epoch seconds, TS_MISSING if none
+PRIOR_SRC = "_src_prior"   # SOURCE_PRIOR of the chunk's source
+PRIOR_KEYS = (PRIOR_TS, PRIOR_SRC)
+
+FRESH_DAYS = 180  # freshness decays linearly to 0 over this many days
+
+def source_prior(src: Optional[str]) -> float:
+    return SOURCE_PRIOR.get((src or "docs").lower(), _UNKNOWN_PRIOR)
+
+def static_priors(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Query-independent priors of a chunk row; store rows carry them as typed columns already."""
+    ts = row.get("timestamp")
+    if ts is None:
+        ts = row_timestamp(row.get("meta") or {})
+    sp = row.get("src_prior")
+    return {PRIOR_TS: int(ts), PRIOR_SRC: float(sp) if sp is not None else source_prior(row.get("source"))}
 
 def _freshness(ts: str | None) -> float:
     """Temporal freshness (0–1): newer → closer to 1; None returns 0.5."""
-    if not ts: return 0.5
-    try:
-        t = dtparser.parse(ts)
-    except Exception:
-        return 0.5
-    days = max(0, (datetime.utcnow() - t).days)
+    return float(_freshness_vec(np.array([parse_ts(ts)], dtype=np.int64), time.time())[0])
+
+def _freshness_vec(ts: np.ndarray, now: float) -> np.ndarray:
+    days = np.maximum(0, (now - ts) // 86400)
     # Decays to ~0 after 180 days; within ~7 days it's close to 1
-    if days >= 180: return 0.0
-    return max(0.0, 1.0 - days / 180.0)
+    fresh = np.clip(1.0 - days / FRESH_DAYS, 0.0, 1.0)
+    return np.where(ts == TS_MISSING, 0.5, fresh)
+
+def evidence_weights(metas: Sequence[Dict[str, Any]], base_scores: Sequence[float],
+                     now: Optional[float] = None) -> np.ndarray:
+    """
+    evidence_weight for a whole candidate set in one NumPy expression.
+    Uses the precomputed priors (PRIOR_TS / PRIOR_SRC) when present, and one query-time `now`.
+    """
+    n = len(metas)
+    if n == 0:
+        return np.zeros(0, dtype=np.float64)
+    now = time.time() if now is None else now
+    fused = np.fromiter((float(m.get("_fused_raw", b or 0.0)) for m, b in zip(metas, base_scores)),
+                        dtype=np.float64, count=n)
+    sw = np.fromiter((m[PRIOR_SRC] if PRIOR_SRC in m else source_prior(m.get("source")) for m in metas),
+                     dtype=np.float64, count=n)
+    ts = np.fromiter((m[PRIOR_TS] if PRIOR_TS in m else row_timestamp(m) for m in metas),
+                     dtype=np.int64, count=n)
+    fused_norm = 1.0 / (1.0 + np.power(2.71828, -fused))  # sigmoid
+    return 0.6 * fused_norm + 0.3 * sw + 0.1 * _freshness_vec(ts, now)
 
 def evidence_weight(meta: Dict[str, Any], base_score: float) -> float:
     """
@@ -25,15 +65,4 @@ def evidence_weight(meta: Dict[str, Any], base_score: float) -> float:
     - base_score: score from the fusion stage (e.g., QueryFusion's relative_score)
     - If meta["_fused_raw"] exists, prefer that value
     """
-    fused = float(meta.get("_fused_raw", base_score or 0.0))
-    # Simple normalization (stable enough; for strict normalization, do it in the pipeline)
-    fused_norm = 1.0 / (1.0 + pow(2.71828, -fused))  # sigmoid
-
-    src = (meta.get("source") or "docs").lower()
-    sw  = SOURCE_WEIGHT.get(src, 1.0)
-    # Normalize to 0–1
-    sw_norm = (sw - min(SOURCE_WEIGHT.values())) / (max(SOURCE_WEIGHT.values()) - min(SOURCE_WEIGHT.values()) or 1.0)
-
-    fresh = _freshness(meta.get("time") or meta.get("timestamp"))
-
-    return 0.6 * fused_norm + 0.3 * sw_norm + 0.1 * fresh
+    return float(evidence_weights([meta], [base_score])[0])
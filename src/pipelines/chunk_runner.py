@@ -1,11 +1,15 @@
 # src/pipelines/chunk_runner.py
 from pathlib import Path
 import json
+from contextlib import nullcontext
 from typing import List
 
 from src.chunking.doc_chunker import chunk_doc
 from src.chunking.blog_chunker import chunk_blog
 from src.chunking.forum_chunker import chunk_forum_thread
+from src.chunking.dedup import dedup_jsonl
+from src.store.chunk_store import ChunkStoreWriter
+from src.store.bm25_index import write_bm25_index
 
 def _pick_dir(root: Path, *candidates: str) -> Path | None:
     for rel in candidates:
@@ -38,23 +42,45 @@ def _iter_forums(root: Path):
     for rel in ("data/forums/threads.jsonl", "forums/threads.jsonl"):
         f = root / rel
         if f.is_file():
-            lines = f.read_text(encoding="utf-8").splitlines()
-            print(f"[forums] using {f} -> {len(lines)} lines")
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    yield json.loads(line)
-                except Exception as e:
-                    print("[forums] bad JSONL line:", e)
+            # Stream line by line: forum dumps can be larger than RAM
+            print(f"[forums] using {f}")
+            n = 0
+            with f.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    n += 1
+                    try:
+                        yield json.loads(line)
+                    except Exception as e:
+                        print("[forums] bad JSONL line:", e)
+            print(f"[forums] {f} -> {n} lines")
             return
     print("[forums] NOT FOUND under", root)
 
+def _iter_chunks(root: Path, sources: List[str]):
+    if "docs" in sources:
+        for p, md in _iter_docs(root):
+            rel = str(p.relative_to(root))
+            yield from chunk_doc(md, rel)
+    if "forums" in sources:
+        for thread in _iter_forums(root):
+            yield from chunk_forum_thread(thread)
+    if "blogs" in sources:
+        for p, md in _iter_blogs(root):
+            rel = str(p.relative_to(root))
+            yield from chunk_blog(md, rel)
+
 def run_chunk(data_root: str = ".", out_path: str = "artifacts/chunks.jsonl",
-              sources: List[str] = None) -> int:
+              sources: List[str] = None, columnar_out: str | None = None,
+              dedup_threshold: float | None = None, bm25_out: str | None = None) -> int:
     """
     Build chunks.jsonl from docs/forums/blogs.
+    If columnar_out is given, also write a memory-mapped columnar store there (see src/store/chunk_store.py).
+    If dedup_threshold is given, near-duplicate chunks (MinHash Jaccard >= threshold) are collapsed
+    into one row carrying the member ids (see src/chunking/dedup.py).
+    If bm25_out is given, a BM25 inverted index of the final chunks is written there (see src/store/bm25_index.py).
     Returns the number of chunks written.
     """
     if sources is None:
@@ -63,24 +89,32 @@ def run_chunk(data_root: str = ".", out_path: str = "artifacts/chunks.jsonl",
     root = Path(data_root)
     outp = Path(out_path)
     outp.parent.mkdir(parents=True, exist_ok=True)
+    # With dedup, chunk into a staging file first; the dedup pass writes the real output
+    raw = outp.with_name(outp.name + ".raw") if dedup_threshold is not None else outp
 
     total = 0
-    with outp.open("w", encoding="utf-8") as w:
-        if "docs" in sources:
-            for p, md in _iter_docs(root):
-                rel = str(p.relative_to(root))
-                for ch in chunk_doc(md, rel):
-                    w.write(json.dumps(ch, ensure_ascii=False) + "\n")
-                    total += 1
-        if "forums" in sources:
-            for thread in _iter_forums(root):
-                for ch in chunk_forum_thread(thread):
-                    w.write(json.dumps(ch, ensure_ascii=False) + "\n")
-                    total += 1
-        if "blogs" in sources:
-            for p, md in _iter_blogs(root):
-                rel = str(p.relative_to(root))
-                for ch in chunk_blog(md, rel):
-                    w.write(json.dumps(ch, ensure_ascii=False) + "\n")
-                    total += 1
+    # The writer discards its tmp directory if chunking fails part-way (e.g. a bad .md encoding)
+    writer = ChunkStoreWriter(columnar_out) if columnar_out and raw is outp else nullcontext()
+    with writer as store, raw.open("w", encoding="utf-8") as w:
+        for ch in _iter_chunks(root, sources):
+            w.write(json.dumps(ch, ensure_ascii=False) + "\n")
+            if store is not None:
+                store.add(ch)
+            total += 1
+
+    if raw is not outp:
+        kept, collapsed = dedup_jsonl(str(raw), str(outp), threshold=dedup_threshold)
+        raw.unlink()
+        print(f"[dedup] {total} chunks -> {kept} kept, {collapsed} collapsed (threshold={dedup_threshold})")
+        total = kept
+        if columnar_out:
+            with ChunkStoreWriter(columnar_out) as st, outp.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        st.add(json.loads(line))
+    if bm25_out:
+        from src.fusion.utils import artifact_version  # lazy: pulls in llama_index
+        # One pass over the final jsonl; the version lets fusion tell a later rewrite apart
+        write_bm25_index(str(outp), bm25_out, artifact_version(str(outp)))
+        print(f"[bm25] {total} chunks indexed -> {bm25_out}")
     return total
@@ -0,0 +1,95 @@
+# src/pipelines/query_pipeline.py
+"""
+The `fusion` query path as explicit stages: retrieve -> rank -> pack -> synthesize.
+
+RetrieverQueryEngine.query() runs all of these in one call and only hands back the
+nodes that reached the synthesizer. Keeping the stages separate lets ask() hold on to
+the ranked list: the no_text fallback on a synthesis error and the GraphRAG check
+reuse it instead of re-running embedding, retrieval, fusion and the cross-encoder.
+
+With `snapshots` (a SnapshotManager) the retriever reads whichever index snapshot the
+query pinned; pin() keeps one query on one index version across all of its stages.
+"""
+from __future__ import annotations
+import time
+from contextlib import nullcontext
+from typing import List, NamedTuple, Optional, Sequence
+
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from src.telemetry.tracing import span
+from src.telemetry.memory import mem_stage
+
+
+class StagedResult(NamedTuple):
+    ranked: List[NodeWithScore]   # after fusion + rank postprocessors (full text)
+    context: List[NodeWithScore]  # what the synthesizer saw (after packing)
+    response: Response            # a StreamingResponse when the synthesizer streams
+    synth_start: float            # perf_counter() when synthesis started (TTFT / synth time origin)
+
+
+def no_text_response(nodes: List[NodeWithScore]) -> Response:
+    """What response_mode="no_text" returns: the nodes, no answer."""
+    return Response(response=None, source_nodes=list(nodes))
+
+
+class QueryPipeline:
+    def __init__(self, retriever, rankers: Optional[Sequence] = None, packers: Optional[Sequence] = None,
+                 synthesizer=None, snapshots=None):
+        self.retriever = retriever
+        self.snapshots = snapshots
+        self.rankers = list(rankers or [])
+        self.packers = list(packers or [])
+        self.synthesizer = synthesizer
+
+    @classmethod
+    def from_engine(cls, engine, packers: Optional[Sequence] = None, snapshots=None):
+        """Split a RetrieverQueryEngine (as built by build_fusion_engine) into stages."""
+        return cls(engine._retriever, engine._node_postprocessors, packers, engine._response_synthesizer,
+                   snapshots=snapshots)
+
+    def pin(self):
+        """Context manager yielding the IndexSnapshot this query runs on (None without snapshots)."""
+        return self.snapshots.pin() if self.snapshots is not None else nullcontext()
+
+    @property
+    def index_version(self) -> Optional[str]:
+        return self.snapshots.version if self.snapshots is not None else None
+
+    @staticmethod
+    def _apply(postprocessors, qb: QueryBundle, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        for p in postprocessors:
+            nodes = p.postprocess_nodes(nodes, query_bundle=qb)
+        return nodes
+
+    def retrieve(self, qb: QueryBundle) -> List[NodeWithScore]:
+        with span("retrieve"), mem_stage("retrieve"):
+            return self.retriever.retrieve(qb)
+
+    def rank(self, qb: QueryBundle, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        return self._apply(self.rankers, qb, nodes)
+
+    def pack(self, qb: QueryBundle, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        return self._apply(self.packers, qb, nodes)
+
+    def synthesize(self, qb: QueryBundle, nodes: List[NodeWithScore]) -> Response:
+        if self.synthesizer is None:
+            return no_text_response(nodes)
+        with span("synthesize", n=len(nodes)):
+            return self.synthesizer.synthesize(qb, nodes)
+
+    def run(self, qb: QueryBundle, ranked: Optional[List[NodeWithScore]] = None) -> StagedResult:
+        """Full path; pass `ranked` to start from an already-ranked list (e.g. a semantic-cache hit)."""
+        if ranked is None:
+            ranked = self.rank(qb, self.retrieve(qb))
+        context = self.pack(qb, ranked)
+        t0 = time.perf_counter()
+        try:
+            resp = self.synthesize(qb, context)
+        except ValueError as e:
+            if "available context size" not in str(e):
+                raise
+            print("[WARN] answer synthesis overflow; falling back to no_text")
+            resp = no_text_response(context)
+        return StagedResult(ranked, context, resp, t0)
@@ -0,0 +1,164 @@
+# src/pipelines/query_service.py
+"""
+QueryService: a QueryPipeline behind a Python API that many threads can call at once.
+
+    svc = QueryService(build_engine(args), workers=4, max_queue=32)
+    res = svc.query("what retries policy should I use?")   # blocking, from any thread
+    fut = svc.submit("...")                                 # or a Future
+
+- Bounded pool: `workers` threads run queries and at most `max_queue` more wait for
+  one. submit() past that raises Overloaded at once (admission control), so an
+  overloaded process sheds load instead of letting every caller's latency grow.
+- Single-flight: a query equal (normalize_query) to one already queued or running
+  joins it instead of being computed again; joining takes no worker or queue slot.
+- Isolation: the rank stages work on copies of the retrieved nodes, and every caller of
+  a coalesced query gets its own copies of the result, so score and metadata writes
+  (rerank, retrieval_score) never reach nodes held by the index or by another caller.
+- Settings is global: the embedding model is captured when the service is built and the
+  query is embedded here, so retrievers never read Settings.embed_model mid-query. The
+  service never writes Settings.
+- metrics(): queue depth (now and peak), running, in-flight keys, admitted / rejected /
+  coalesced / completed / failed counts, queue-wait percentiles.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.settings import Settings
+
+from src.cache.query_cache import normalize_query
+from src.telemetry.stats import collect_stats, record
+from src.telemetry.tracing import span
+
+
+class Overloaded(RuntimeError):
+    """submit() found every worker busy and the queue full."""
+
+
+class QueryResult(NamedTuple):
+    query: str
+    ranked: List[NodeWithScore]   # after fusion + rank postprocessors
+    response: Response            # source_nodes = what the synthesizer saw
+    index_version: Optional[str]
+    stats: Dict[str, Any]         # per-query counters (queue_ms, k_per_source, ...)
+    coalesced: bool               # served by joining an identical in-flight query
+
+
+def copy_nodes(nodes: Optional[List[NodeWithScore]]) -> List[NodeWithScore]:
+    """Per-request copies: own NodeWithScore, node and metadata dict (text is an immutable str)."""
+    return [NodeWithScore(node=n.node.model_copy(update={"metadata": dict(n.node.metadata or {})}), score=n.score)
+            for n in nodes or []]
+
+
+def copy_result(res: QueryResult, coalesced: bool) -> QueryResult:
+    r = res.response
+    resp = Response(response=r.response, source_nodes=copy_nodes(r.source_nodes), metadata=dict(r.metadata or {}))
+    return res._replace(ranked=copy_nodes(res.ranked), response=resp, stats=dict(res.stats), coalesced=coalesced)
+
+
+class QueryService:
+    def __init__(self, pipeline, workers: int = 4, max_queue: int = 32, embed_model=None):
+        if getattr(pipeline.synthesizer, "_streaming", False):
+            raise ValueError("QueryService needs a non-streaming synthesizer (a token stream can't be shared)")
+        self.pipeline = pipeline
+        self.workers = workers
+        self.max_queue = max_queue
+        self.embed_model = embed_model if embed_model is not None else Settings.embed_model
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self._lock = threading.Lock()
+        self._flights: Dict[str, List[Tuple[Future, bool]]] = {}  # key -> (caller future, joined)
+        self._closed = False
+        self._queued = self._running = self._peak_queued = 0
+        self._counts = {"admitted": 0, "rejected": 0, "coalesced": 0, "completed": 0, "failed": 0}
+        self._waits: deque = deque(maxlen=4096)  # recent queue waits (ms)
+
+    def submit(self, query: str) -> Future:
+        """Future of a QueryResult; raises Overloaded when the pool and queue are full."""
+        key = normalize_query(query)
+        fut: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("QueryService is closed")
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.append((fut, True))
+                self._counts["coalesced"] += 1
+                return fut
+            if self._queued + self._running >= self.workers + self.max_queue:
+                self._counts["rejected"] += 1
+                raise Overloaded(f"{self._running} running, {self._queued} queued (max_queue={self.max_queue})")
+            self._flights[key] = [(fut, False)]
+            self._counts["admitted"] += 1
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+        self._pool.submit(self._run, key, query, time.perf_counter())
+        return fut
+
+    def query(self, query: str, timeout: Optional[float] = None) -> QueryResult:
+        return self.submit(query).result(timeout=timeout)
+
+    def _run(self, key: str, query: str, t_enq: float):
+        wait_ms = (time.perf_counter() - t_enq) * 1000
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._waits.append(wait_ms)
+        res = err = None
+        try:
+            res = self._compute(query, wait_ms)
+        except BaseException as e:  # handed to every waiter
+            err = e
+        with self._lock:
+            self._running -= 1
+            waiters = self._flights.pop(key)
+            self._counts["failed" if err is not None else "completed"] += 1
+        if err is not None:
+            for fut, _ in waiters:
+                fut.set_exception(err)
+            return
+        # Copies for the joiners are taken before the first caller gets (and may mutate) the original
+        out = [(fut, copy_result(res, True) if joined else res) for fut, joined in waiters]
+        for fut, r in out:
+            fut.set_result(r)
+
+    def _compute(self, query: str, wait_ms: float) -> QueryResult:
+        qb = QueryBundle(query_str=query)
+        p = self.pipeline
+        with collect_stats() as st, p.pin() as snap:
+            record(queue_ms=round(wait_ms, 3))
+            if self.embed_model is not None:
+                with span("embed"):
+                    qb.embedding = self.embed_model.get_agg_embedding_from_queries(qb.embedding_strs)
+            ranked = p.rank(qb, copy_nodes(p.retrieve(qb)))
+            out = p.run(qb, ranked=ranked)
+            version = snap.version if snap is not None else p.index_version
+        resp = out.response
+        resp.metadata = dict(resp.metadata or {}, index_version=version)
+        return QueryResult(query, out.ranked, resp, version, dict(st), False)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = list(self._waits)
+            m = dict(self._counts, queued=self._queued, running=self._running, peak_queued=self._peak_queued,
+                     in_flight=len(self._flights), workers=self.workers, max_queue=self.max_queue)
+        m["queue_ms_p50"] = round(float(np.percentile(waits, 50)), 3) if waits else 0.0
+        m["queue_ms_p99"] = round(float(np.percentile(waits, 99)), 3) if waits else 0.0
+        return m
+
+    def close(self, wait: bool = True):
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -10,10 +10,17 @@ from llama_index.core.postprocessor import SentenceTransformerRerank
 def build_reranker(
     model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
     top_n: int = 10,
-) -> SentenceTransformerRerank:
+    pretokenized: bool = False,
+    passage_cache=None,
+):
     """
     Cross-encoder pairwise reranker: re-score fused candidates and keep the top_n.
+    pretokenized: same scores, but passages come from a PassageTokenCache (see
+    src/rerank/pretokenized.py) and only the query is tokenized per call.
     """
+    if pretokenized:
+        from .pretokenized import PretokenizedRerank
+        return PretokenizedRerank(model=model, top_n=top_n, keep_retrieval_score=True, cache=passage_cache)
     return SentenceTransformerRerank(
         model=model,
         top_n=top_n,
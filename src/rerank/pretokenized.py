@@ -0,0 +1,235 @@
+# src/rerank/pretokenized.py
+"""
+Cross-encoder reranking on pre-tokenized passages.
+
+SentenceTransformerRerank hands (query, passage) strings to CrossEncoder.predict,
+which re-tokenizes every candidate's full text on each query although chunk texts
+only change with a corpus build. PassageTokenCache holds the passage side tokenized
+once per corpus + rerank model: all token ids in one int32 array with offsets, keyed
+by chunk id, plus a crc32 of the exact passage string so a node whose text differs
+from the cached one (e.g. split by the node parser) is tokenized on the fly instead.
+It is saved next to the chunk artifact and reused while the artifact version matches.
+
+PretokenizedRerank tokenizes only the query, joins ids with the model's special
+tokens, applies the tokenizer's "longest_first" pair truncation itself and runs the
+same model + activation as CrossEncoder.predict, so scores should match
+SentenceTransformerRerank. It is opt-in (--rerank-pretok) until eval/bench_rerank.py
+has recorded a zero score difference against the plain reranker.
+"""
+from __future__ import annotations
+import os
+import zlib
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from src.telemetry.stats import incr
+
+MAX_LENGTH = 512  # SentenceTransformerRerank's CrossEncoder max_length
+
+
+def passage_fingerprint(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def cache_path(chunks_path: str, model: str) -> str:
+    return f"{chunks_path}.rerank-{model.replace('/', '__')}.npz"
+
+
+class PassageTokenCache:
+    def __init__(self, ids: Sequence[str], offsets: np.ndarray, tokens: np.ndarray, fps: np.ndarray,
+                 model: str = "", version: str = ""):
+        self.offsets = offsets  # int64, len(ids) + 1
+        self.tokens = tokens    # int32, all passages back to back
+        self.fps = fps          # uint32 crc32 of each passage string
+        self.model = model
+        self.version = version
+        self._row = {cid: i for i, cid in enumerate(ids)}
+        self._ids = list(ids)
+
+    def __len__(self):
+        return len(self._row)
+
+    @property
+    def nbytes(self) -> int:
+        return self.tokens.nbytes + self.offsets.nbytes + self.fps.nbytes
+
+    def get(self, chunk_id: Optional[str], text: str) -> Optional[np.ndarray]:
+        """Cached ids for this chunk, or None if missing / the passage text is not the cached one."""
+        i = self._row.get(chunk_id)
+        if i is None or int(self.fps[i]) != passage_fingerprint(text):
+            return None
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    @classmethod
+    def build(cls, passages: Iterable[Tuple[str, str]], tokenizer, max_length: int = MAX_LENGTH,
+              model: str = "", version: str = "", batch_size: int = 512) -> "PassageTokenCache":
+        """passages: (chunk_id, exact passage string the reranker sees)."""
+        ids: List[str] = []
+        fps: List[int] = []
+        parts: List[np.ndarray] = []
+        batch: List[Tuple[str, str]] = []
+
+        def flush():
+            enc = tokenizer([t for _, t in batch], add_special_tokens=False, truncation=True,
+                            max_length=max_length)["input_ids"]
+            for (cid, t), toks in zip(batch, enc):
+                ids.append(cid)
+                fps.append(passage_fingerprint(t))
+                parts.append(np.asarray(toks, dtype=np.int32))
+            batch.clear()
+
+        seen = set()
+        for cid, text in passages:
+            if cid in seen:
+                continue
+            seen.add(cid)
+            batch.append((cid, text))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parts], out=offsets[1:])
+        tokens = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        return cls(ids, offsets, tokens, np.asarray(fps, dtype=np.uint32), model=model, version=version)
+
+    def save(self, path: str):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, ids=np.asarray(self._ids, dtype=str), offsets=self.offsets, tokens=self.tokens,
+                 fps=self.fps, model=np.asarray(self.model), version=np.asarray(self.version))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PassageTokenCache":
+        z = np.load(path, allow_pickle=False)
+        return cls(z["ids"].tolist(), z["offsets"], z["tokens"], z["fps"],
+                   model=str(z["model"]), version=str(z["version"]))
+
+
+def load_or_build_cache(path: str, passages, tokenizer, model: str, version: str,
+                        max_length: int = MAX_LENGTH) -> PassageTokenCache:
+    """Reuse the cache at `path` if it was built for this artifact version and model, else rebuild it."""
+    if os.path.exists(path):
+        try:
+            cache = PassageTokenCache.load(path)
+            if cache.version == version and cache.model == model:
+                return cache
+        except (OSError, ValueError, KeyError):
+            pass
+    cache = PassageTokenCache.build(passages(), tokenizer, max_length=max_length, model=model, version=version)
+    cache.save(path)
+    return cache
+
+
+def truncate_pair(q: Sequence[int], p: Sequence[int], budget: int) -> Tuple[Sequence[int], Sequence[int]]:
+    """HF "longest_first": drop one token at a time from the longer side (the passage on ties)."""
+    over = len(q) + len(p) - budget
+    if over <= 0:
+        return q, p
+    first = min(over, abs(len(p) - len(q)))
+    if len(p) >= len(q):
+        p = p[:len(p) - first]
+    else:
+        q = q[:len(q) - first]
+    rest = over - first
+    if rest:
+        p = p[:len(p) - (rest + 1) // 2]
+        q = q[:len(q) - rest // 2]
+    return q, p
+
+
+class PretokenizedRerank(BaseNodePostprocessor):
+    model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    top_n: int = 10
+    keep_retrieval_score: bool = True
+    max_length: int = MAX_LENGTH
+    batch_size: int = 32
+    _ce: Any = PrivateAttr(default=None)
+    _cache: Any = PrivateAttr(default=None)  # PassageTokenCache, or a callable resolving one per query
+
+    def __init__(self, cache: Optional[PassageTokenCache] = None, cross_encoder=None, **kwargs):
+        super().__init__(**kwargs)
+        if cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+            cross_encoder = CrossEncoder(self.model, max_length=self.max_length)
+        self._ce = cross_encoder
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "PretokenizedRerank"
+
+    @property
+    def tokenizer(self):
+        return self._ce.tokenizer
+
+    def set_cache(self, cache: Union[PassageTokenCache, Callable[[], Optional[PassageTokenCache]], None]):
+        """A fixed cache, or a callable returning the one of the query's index snapshot."""
+        self._cache = cache
+
+    def _resolve_cache(self) -> Optional[PassageTokenCache]:
+        return self._cache() if callable(self._cache) else self._cache
+
+    def _passage_ids(self, node, cache: Optional[PassageTokenCache]) -> np.ndarray:
+        text = node.get_content(metadata_mode=MetadataMode.EMBED)
+        ids = cache.get((node.metadata or {}).get("id"), text) if cache is not None else None
+        if ids is not None:
+            incr("rerank_pretok_hits")
+            return ids
+        incr("rerank_pretok_misses")
+        return np.asarray(self.tokenizer(text, add_special_tokens=False, truncation=True,
+                                         max_length=self.max_length)["input_ids"], dtype=np.int32)
+
+    def _encode(self, q: List[int], p: np.ndarray) -> Tuple[List[int], List[int]]:
+        tok = self.tokenizer
+        q, p = truncate_pair(q, p.tolist(), self.max_length - tok.num_special_tokens_to_add(pair=True))
+        return tok.build_inputs_with_special_tokens(q, p), tok.create_token_type_ids_from_sequences(q, p)
+
+    def _scores(self, pairs: List[Tuple[List[int], List[int]]]) -> List[float]:
+        import torch
+        model = self._ce.model
+        act = getattr(self._ce, "activation_fn", None) or getattr(self._ce, "default_activation_function", None)
+        pad = self.tokenizer.pad_token_id or 0
+        out: List[float] = []
+        model.eval()
+        with torch.inference_mode():
+            for s in range(0, len(pairs), self.batch_size):
+                chunk = pairs[s:s + self.batch_size]
+                width = max(len(ids) for ids, _ in chunk)
+                input_ids = torch.full((len(chunk), width), pad, dtype=torch.long)
+                types = torch.zeros((len(chunk), width), dtype=torch.long)
+                mask = torch.zeros((len(chunk), width), dtype=torch.long)
+                for i, (ids, tt) in enumerate(chunk):
+                    input_ids[i, :len(ids)] = torch.tensor(ids)
+                    types[i, :len(tt)] = torch.tensor(tt)
+                    mask[i, :len(ids)] = 1
+                inputs = {"input_ids": input_ids, "attention_mask": mask}
+                if "token_type_ids" in self.tokenizer.model_input_names:
+                    inputs["token_type_ids"] = types
+                dev = model.device
+                logits = model(**{k: v.to(dev) for k, v in inputs.items()}).logits
+                if act is not None:
+                    logits = act(logits)
+                if logits.shape[1] == 1:
+                    logits = logits[:, 0]
+                out.extend(logits.float().cpu().tolist())
+        return out
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("Missing query bundle in extra info.")
+        if not nodes:
+            return []
+        q = self.tokenizer(query_bundle.query_str, add_special_tokens=False)["input_ids"]
+        cache = self._resolve_cache()
+        scores = self._scores([self._encode(q, self._passage_ids(n.node, cache)) for n in nodes])
+        for n, sc in zip(nodes, scores):
+            if self.keep_retrieval_score:
+                n.node.metadata["retrieval_score"] = n.score
+            n.score = sc
+        return sorted(nodes, key=lambda x: -x.score if x.score else 0)[:self.top_n]
@@ -0,0 +1,114 @@
+# src/rerank/sibling_collapse.py
+"""
+Collapse overlapping sibling windows before the cross-encoder.
+
+chunk_doc / chunk_blog emit overlapping windows "<file>#c0, #c1, ...". Fusion often
+returns several adjacent windows of one file, and the cross-encoder would score each.
+The #cN counter runs across the whole file (sections, code blocks), so consecutive
+indices are only siblings within one span: candidates are grouped by (parent file,
+section_path, content_type), each group is split into runs of consecutive window
+indices, and merges every run into one node (overlap removed)
+as long as the merged text stays under `token_budget`; a run that does not fit is
+cut into several merged nodes. Non-window ids (forum "#qa", "#a0011") pass through.
+"""
+from __future__ import annotations
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from src.telemetry.stats import incr
+
+_WINDOW_ID = re.compile(r"^(?P<parent>.+)#c(?P<idx>\d+)$")
+
+
+def split_window_id(cid: str) -> Optional[Tuple[str, int]]:
+    m = _WINDOW_ID.match(cid or "")
+    return (m.group("parent"), int(m.group("idx"))) if m else None
+
+
+def sibling_key(meta: Dict[str, Any]) -> Optional[Tuple[str, Tuple[str, ...], Any, int]]:
+    """(parent, section_path, content_type, window index) of a window chunk; None for other ids."""
+    w = split_window_id(meta.get("id"))
+    if w is None:
+        return None
+    return w[0], tuple(meta.get("section_path") or ()), meta.get("content_type"), w[1]
+
+
+def overlap_len(at: List[str], bt: List[str], max_overlap: int = 100) -> int:
+    """Length of the longest suffix of at that is also a prefix of bt (<= max_overlap)."""
+    for k in range(min(max_overlap, len(at), len(bt)), 0, -1):
+        if at[-k:] == bt[:k]:
+            return k
+    return 0
+
+
+def merge_overlapping(a: str, b: str, max_overlap: int = 100) -> str:
+    """a + b with the longest token suffix of a that prefixes b (<= max_overlap tokens) dropped once."""
+    at, bt = a.split(), b.split()
+    return " ".join(at + bt[overlap_len(at, bt, max_overlap):])
+
+
+class SiblingCollapse(BaseNodePostprocessor):
+    token_budget: int = 512
+    max_overlap: int = 100
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SiblingCollapse"
+
+    def _merge_run(self, run: List[NodeWithScore]) -> List[NodeWithScore]:
+        out, group, text = [], [], ""
+        for n in run:
+            t = n.node.get_content()
+            cand = merge_overlapping(text, t, self.max_overlap) if group else t
+            if group and len(cand.split()) > self.token_budget:
+                out.append(self._emit(group, text))
+                group, cand = [], t
+            group.append(n)
+            text = cand
+        if group:
+            out.append(self._emit(group, text))
+        return out
+
+    @staticmethod
+    def _emit(group: List[NodeWithScore], text: str) -> NodeWithScore:
+        if len(group) == 1:
+            return group[0]
+        best = max(group, key=lambda n: n.score or 0.0)
+        meta = dict(best.node.metadata or {})
+        meta["merged_ids"] = [(n.node.metadata or {}).get("id") for n in group]
+        node = TextNode(id_=best.node.node_id, text=text, metadata=meta,
+                        excluded_embed_metadata_keys=list(best.node.excluded_embed_metadata_keys) + ["merged_ids"],
+                        excluded_llm_metadata_keys=list(best.node.excluded_llm_metadata_keys) + ["merged_ids"])
+        return NodeWithScore(node=node, score=best.score)
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        by_parent: Dict[tuple, List[Tuple[int, NodeWithScore]]] = defaultdict(list)
+        passthrough: List[NodeWithScore] = []
+        for n in nodes:
+            k = sibling_key(n.node.metadata or {})
+            if k is None:
+                passthrough.append(n)
+            else:
+                by_parent[k[:3]].append((k[3], n))
+
+        out = list(passthrough)
+        for _, items in by_parent.items():
+            items.sort(key=lambda x: x[0])
+            run = [items[0][1]]
+            for (prev, _), (idx, n) in zip(items, items[1:]):
+                if idx == prev + 1:
+                    run.append(n)
+                else:
+                    out.extend(self._merge_run(run))
+                    run = [n]
+            out.extend(self._merge_run(run))
+
+        out.sort(key=lambda n: n.score or 0.0, reverse=True)
+        saved = len(nodes) - len(out)
+        incr("rerank_pairs_saved", saved)
+        return out
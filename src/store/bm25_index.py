@@ -0,0 +1,193 @@
+# src/store/bm25_index.py
+"""
+Compact BM25 inverted index over the chunk artifact, written by run_chunk (--bm25).
+
+Layout (one .npz, default <chunks.jsonl>.bm25.npz):
+  terms      str     sorted vocabulary (lowercased chunker word tokens; punctuation dropped)
+  offsets    int64   posting list of term t is [offsets[t], offsets[t+1])
+  docs       int32   posting doc numbers, ascending within a term
+  tfs        uint16  term frequency per posting (clipped at 65535)
+  doc_len    int32   indexed tokens per chunk
+  doc_src    uint8   0=docs, 1=forums, 2=blogs
+  row_blob   uint8   the chunks' jsonl lines, concatenated (parsed only for hits)
+  row_off    int64   line of doc d is row_blob[row_off[d]:row_off[d+1]]
+  ids        str     chunk ids
+  format     int     FORMAT; an index of another layout is rejected on open
+  version    str     artifact_version() of the jsonl it was built from ("" if unknown)
+
+A query only touches the postings of its own terms, so scoring cost is the summed
+posting length of the query terms, not the corpus size. The index carries its own
+copy of the rows, so it never reads the jsonl again: an open index (e.g. held by an
+older snapshot) keeps returning its own rows after chunks.jsonl is rewritten or moved.
+"""
+from __future__ import annotations
+import json
+import os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.chunking.common import word_tokens
+from src.store.chunk_store import SOURCE_CODES
+
+K1 = 1.2
+B = 0.75
+FORMAT = 2  # 1 = rows read from the jsonl at stored byte offsets
+
+
+def bm25_path(chunks_path: str) -> str:
+    return f"{chunks_path}.bm25.npz"
+
+
+def terms_of(text: str) -> List[str]:
+    """Index terms: the chunker's word tokens, lowercased, single punctuation marks dropped."""
+    return [t.lower() for t in word_tokens(text or "") if len(t) > 1 or t.isalnum()]
+
+
+class BM25Writer:
+    def __init__(self, path: str, version: str = ""):
+        self.path = path
+        self.version = version
+        self._post: Dict[str, Tuple[array, array]] = {}
+        self._len = array("i")
+        self._src = array("B")
+        self._blob = bytearray()
+        self._off = array("q", [0])
+        self._ids: List[str] = []
+
+    def add(self, row: Dict[str, Any], line: bytes):
+        """row: one chunk dict; line: its jsonl line, kept verbatim for rows()."""
+        doc = len(self._ids)
+        counts: Dict[str, int] = {}
+        terms = terms_of(row.get("text", ""))
+        for t in terms:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            p = self._post.get(t)
+            if p is None:
+                p = self._post[t] = (array("i"), array("i"))
+            p[0].append(doc)
+            p[1].append(tf)
+        self._len.append(len(terms))
+        self._src.append(SOURCE_CODES.get((row.get("source") or "").lower(), 0))
+        self._blob += line.rstrip(b"\r\n")
+        self._off.append(len(self._blob))
+        self._ids.append(str(row.get("id") or ""))
+
+    def close(self) -> int:
+        vocab = sorted(self._post)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum([len(self._post[t][0]) for t in vocab], out=offsets[1:])
+        docs = np.concatenate([np.frombuffer(self._post[t][0], dtype=np.int32) for t in vocab]) \
+            if vocab else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate([np.minimum(np.frombuffer(self._post[t][1], dtype=np.int32), 65535)
+                              for t in vocab]).astype(np.uint16) if vocab else np.zeros(0, dtype=np.uint16)
+        tmp = self.path + ".tmp.npz"
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(tmp, terms=np.asarray(vocab, dtype=str), offsets=offsets, docs=docs, tfs=tfs,
+                 doc_len=np.frombuffer(self._len, dtype=np.int32), doc_src=np.frombuffer(self._src, dtype=np.uint8),
+                 row_blob=np.frombuffer(bytes(self._blob), dtype=np.uint8),
+                 row_off=np.frombuffer(self._off, dtype=np.int64), ids=np.asarray(self._ids, dtype=str),
+                 format=np.asarray(FORMAT), version=np.asarray(self.version))
+        os.replace(tmp, self.path)
+        n = len(self._ids)
+        self._post.clear()
+        self._blob = bytearray()
+        return n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+def write_bm25_index(jsonl_path: str, path: Optional[str] = None, version: str = "") -> int:
+    """Index an existing chunks.jsonl (one streaming pass); `version` is its artifact_version()."""
+    with BM25Writer(path or bm25_path(jsonl_path), version) as w, open(jsonl_path, "rb") as f:
+        for line in f:
+            if line.strip():
+                w.add(json.loads(line), line)
+    return len(w._ids)
+
+
+class BM25Index:
+    def __init__(self, path: str, k1: float = K1, b: float = B):
+        z = np.load(path, allow_pickle=False)
+        fmt = int(z["format"]) if "format" in z.files else 1
+        if fmt != FORMAT:
+            raise ValueError(f"{path}: BM25 index format {fmt}, expected {FORMAT}; rebuild it")
+        self.path = path
+        self.offsets, self.docs, self.tfs = z["offsets"], z["docs"], z["tfs"]
+        self.doc_src = z["doc_src"]
+        self.row_blob, self.row_off = z["row_blob"], z["row_off"]
+        self.version = str(z["version"]) if "version" in z.files else ""
+        self.ids = z["ids"].tolist()
+        self._term = {t: i for i, t in enumerate(z["terms"].tolist())}
+        dl = z["doc_len"].astype(np.float32)
+        self.n = len(dl)
+        self.k1 = k1
+        # Per-doc length normalization of the BM25 tf term, computed once
+        self._norm = k1 * (1 - b + b * dl / max(float(dl.mean()) if self.n else 1.0, 1.0))
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.offsets, self.docs, self.tfs, self.doc_src, self.row_blob, self.row_off,
+                                      self._norm))
+
+    def search(self, query: str, top_m: int, source: Optional[str] = None) -> List[Tuple[int, float]]:
+        """(doc number, BM25 score) of the best `top_m` chunks (of `source` only, if given)."""
+        touched = []
+        for t in set(terms_of(query)):
+            i = self._term.get(t)
+            if i is None:
+                continue
+            a, z = self.offsets[i], self.offsets[i + 1]
+            d = self.docs[a:z]
+            tf = self.tfs[a:z].astype(np.float32)
+            idf = np.log1p((self.n - len(d) + 0.5) / (len(d) + 0.5))
+            touched.append((d, idf * tf * (self.k1 + 1) / (tf + self._norm[d])))
+        if not touched:
+            return []
+        docs = np.concatenate([d for d, _ in touched])
+        vals = np.concatenate([v for _, v in touched])
+        if source is not None:
+            keep = self.doc_src[docs] == SOURCE_CODES.get(source, 0)
+            docs, vals = docs[keep], vals[keep]
+        if not len(docs):
+            return []
+        uniq, inv = np.unique(docs, return_inverse=True)
+        agg = np.bincount(inv, weights=vals)
+        k = min(top_m, len(uniq))
+        top = np.argpartition(-agg, k - 1)[:k]
+        top = top[np.argsort(-agg[top], kind="stable")]
+        return [(int(uniq[j]), float(agg[j])) for j in top]
+
+    def rows(self, docs: List[int]) -> List[Dict[str, Any]]:
+        return [json.loads(self.row_blob[self.row_off[d]:self.row_off[d + 1]].tobytes()) for d in docs]
+
+    def row(self, doc: int) -> Dict[str, Any]:
+        return self.rows([doc])[0]
+
+
+def load_or_build_bm25(jsonl_path: str, version: str, path: Optional[str] = None) -> BM25Index:
+    """The index at `path`, rebuilt from `jsonl_path` unless it exists, has this layout and was
+    built from artifact version `version` (mtimes alone miss same-tick rewrites and `cp -p`)."""
+    path = path or bm25_path(jsonl_path)
+    if os.path.exists(path):
+        try:
+            index = BM25Index(path)
+            if index.version == version:
+                return index
+            print(f"[BM25] {path} was built from artifact {index.version or '?'}, not {version}; rebuilding")
+        except ValueError as e:  # written by an older layout
+            print(f"[BM25] {e}")
+    write_bm25_index(jsonl_path, path, version)
+    return BM25Index(path)
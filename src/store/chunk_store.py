@@ -0,0 +1,315 @@
+# src/store/chunk_store.py
+"""
+Binary columnar alternative to chunks.jsonl.
+
+Layout (one directory, e.g. artifacts/chunks.store/):
+  manifest.json            row count, per-source [start, stop) ranges, column dtypes
+  text.bin / text.off      UTF-8 blob + int64 offsets (n+1)  -> text(i) is one O(1) slice
+  id.bin   / id.off        same for chunk ids
+  meta.bin / meta.off      same for the JSON-encoded meta dict (only parsed on demand)
+  source.npy               uint8  (0=docs, 1=forums, 2=blogs)
+  accepted.npy             int8   (1/0, -1 = not a forum answer)
+  upvotes.npy              int32
+  timestamp.npy            int64  epoch seconds, -1 = missing
+  src_prior.npy            float32 normalized source weight (scorer.SOURCE_PRIOR), a static evidence prior
+
+Rows are stored grouped by source (stable within a source), so a per-source
+partition is a zero-copy slice of the memory-mapped columns.
+"""
+from __future__ import annotations
+import json
+import mmap
+import os
+import shutil
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dateutil import parser as dtparser
+
+SOURCES = ("docs", "forums", "blogs")
+SOURCE_CODES = {s: i for i, s in enumerate(SOURCES)}
+TS_MISSING = -1
+
+BLOB_COLUMNS = ("text", "id", "meta")
+NUM_COLUMNS = {"source": np.uint8, "accepted": np.int8, "upvotes": np.int32, "timestamp": np.int64,
+               "src_prior": np.float32}
+
+
+def parse_ts(s: Any) -> int:
+    """Date/datetime string -> epoch seconds (UTC if naive); TS_MISSING if absent/unparseable.
+
+    ISO strings take the fast path; anything else ("Mar 3, 2024", ...) goes through
+    dateutil like the original scorer did.
+    """
+    if not s:
+        return TS_MISSING
+    try:
+        t = datetime.fromisoformat(str(s).strip().replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            t = dtparser.parse(str(s))
+        except (ValueError, OverflowError):
+            return TS_MISSING
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return int(t.timestamp())
+
+
+def row_timestamp(meta: Dict[str, Any]) -> int:
+    return parse_ts(meta.get("timestamp") or meta.get("time") or meta.get("published_date"))
+
+
+def _numeric_fields(row: Dict[str, Any], src: str) -> Tuple[int, int, int, int, float]:
+    from src.graphrag.scorer import source_prior  # lazy: scorer imports parse_ts from here
+    meta = row.get("meta") or {}
+    acc = meta.get("accepted")
+    accepted = -1 if acc is None else int(bool(acc))
+    upvotes = int(meta.get("upvotes") or 0)
+    return SOURCE_CODES[src], accepted, upvotes, row_timestamp(meta), source_prior(src)
+
+
+# ------- Writer -------
+class _Part:
+    """Per-source staging area: blobs stream to temp files, fixed-width columns to arrays."""
+    def __init__(self, d: Path):
+        d.mkdir(parents=True, exist_ok=True)
+        self.blobs = {c: (d / f"{c}.bin").open("wb") for c in BLOB_COLUMNS}
+        self.lens = {c: array("q") for c in BLOB_COLUMNS}
+        self.nums = {"source": array("B"), "accepted": array("b"), "upvotes": array("i"), "timestamp": array("q"),
+                     "src_prior": array("f")}
+
+    def add(self, row: Dict[str, Any], src: str):
+        vals = {
+            "text": (row.get("text") or "").encode("utf-8"),
+            "id": (row.get("id") or "").encode("utf-8"),
+            "meta": json.dumps(row.get("meta") or {}, ensure_ascii=False).encode("utf-8"),
+        }
+        for c, b in vals.items():
+            self.blobs[c].write(b)
+            self.lens[c].append(len(b))
+        for c, v in zip(NUM_COLUMNS, _numeric_fields(row, src)):
+            self.nums[c].append(v)
+
+    def close(self):
+        for f in self.blobs.values():
+            f.close()
+
+
+STORE_FORMAT = "astraml-chunkstore"
+
+
+def _is_chunk_store_dir(path: Path) -> bool:
+    try:
+        return json.loads((path / "manifest.json").read_text(encoding="utf-8")).get("format") == STORE_FORMAT
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+class ChunkStoreWriter:
+    """
+    Streaming writer; rows may arrive in any source order.
+    The store is built in a sibling temp directory and moved into place by close(), so a
+    failed build leaves the previous store intact. An existing path is only replaced if it
+    is a chunk store itself (never e.g. the artifacts/ dir holding chunks.jsonl).
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        if self.path.exists() and not _is_chunk_store_dir(self.path):
+            raise FileExistsError(f"{self.path} exists and is not a chunk store; refusing to overwrite it")
+        self._out = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        if self._out.exists():  # left over by a crashed build of this pid
+            shutil.rmtree(self._out)
+        self._tmp = self._out / "_parts"
+        self._parts: Dict[str, _Part] = {}
+        self.n = 0
+
+    def add(self, row: Dict[str, Any]):
+        src = (row.get("source") or "").lower()
+        if src not in SOURCE_CODES:
+            src = "docs"  # same fallback as partition_rows_by_source
+        part = self._parts.get(src)
+        if part is None:
+            part = self._parts[src] = _Part(self._tmp / src)
+        part.add(row, src)
+        self.n += 1
+
+    def close(self) -> int:
+        ranges: Dict[str, List[int]] = {}
+        start = 0
+        for p in self._parts.values():
+            p.close()
+        # Parts are created lazily; with no rows nothing has made the directory yet
+        self._out.mkdir(parents=True, exist_ok=True)
+        if not self.n:
+            print(f"[store] no rows; writing an empty chunk store to {self.path}")
+        for c in BLOB_COLUMNS:
+            offs = [0]
+            with (self._out / f"{c}.bin").open("wb") as out:
+                for src in SOURCES:
+                    part = self._parts.get(src)
+                    if part is None:
+                        continue
+                    with (self._tmp / src / f"{c}.bin").open("rb") as f:
+                        shutil.copyfileobj(f, out)
+                    offs.extend((offs[-1] + np.cumsum(np.frombuffer(part.lens[c], dtype=np.int64))).tolist())
+            np.asarray(offs, dtype=np.int64).tofile(self._out / f"{c}.off")
+        for c, dt in NUM_COLUMNS.items():
+            cols = [np.frombuffer(self._parts[s].nums[c], dtype=dt) for s in SOURCES if s in self._parts]
+            np.save(self._out / f"{c}.npy", np.concatenate(cols) if cols else np.empty(0, dtype=dt))
+        for src in SOURCES:
+            k = len(self._parts[src].nums["source"]) if src in self._parts else 0
+            ranges[src] = [start, start + k]
+            start += k
+        manifest = {
+            "format": STORE_FORMAT,
+            "version": 1,
+            "n": self.n,
+            "sources": ranges,
+            "blob_columns": list(BLOB_COLUMNS),
+            "num_columns": {c: np.dtype(dt).name for c, dt in NUM_COLUMNS.items()},
+        }
+        (self._out / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        self._swap_in()
+        return self.n
+
+    def _swap_in(self):
+        """Move the finished store to self.path; a directory can't be os.replace'd over a non-empty one."""
+        old = None
+        if self.path.exists():
+            if not _is_chunk_store_dir(self.path):  # appeared while we were writing
+                raise FileExistsError(f"{self.path} exists and is not a chunk store; refusing to replace it")
+            old = self.path.with_name(f"{self.path.name}.old-{os.getpid()}")
+            os.replace(self.path, old)
+        os.replace(self._out, self.path)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def _discard(self):
+        """Drop the half-written store; whatever was at self.path stays as it was."""
+        for p in self._parts.values():
+            p.close()
+        shutil.rmtree(self._out, ignore_errors=True)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:  # the rows never finished: no tmp-<pid> directory is left behind
+            self._discard()
+            return False
+        try:
+            self.close()
+        except BaseException:
+            self._discard()
+            raise
+        return False
+
+
+# ------- Reader -------
+class _Blob:
+    def __init__(self, base: Path):
+        self.off = np.memmap(str(base) + ".off", dtype=np.int64, mode="r")
+        size = os.path.getsize(str(base) + ".bin")
+        if size:
+            with open(str(base) + ".bin", "rb") as f:
+                self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.buf = b""
+
+    def get(self, i: int) -> str:
+        return self.buf[self.off[i]:self.off[i + 1]].decode("utf-8")
+
+
+class ChunkStore:
+    """Read-only, memory-mapped view over a chunk store directory (or a row range of it)."""
+    def __init__(self, path: str, _parent: "ChunkStore" = None, _start: int = 0, _stop: Optional[int] = None):
+        if _parent is not None:
+            self.path, self.manifest = _parent.path, _parent.manifest
+            self._blobs, self._cols = _parent._blobs, _parent._cols
+        else:
+            self.path = Path(path)
+            self.manifest = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+            self._blobs = {c: _Blob(self.path / c) for c in self.manifest["blob_columns"]}
+            self._cols = {c: np.load(self.path / f"{c}.npy", mmap_mode="r") if self.manifest["n"] else
+                          np.empty(0, dtype=dt) for c, dt in self.manifest["num_columns"].items()}
+        self.start = _start
+        self.stop = self.manifest["n"] if _stop is None else _stop
+
+    @staticmethod
+    def is_store(path: str) -> bool:
+        return (Path(path) / "manifest.json").is_file()
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    # ---- Slicing (zero-copy) ----
+    def view(self, start: int = 0, stop: Optional[int] = None) -> "ChunkStore":
+        stop = len(self) if stop is None else min(stop, len(self))
+        return ChunkStore(None, _parent=self, _start=self.start + start, _stop=self.start + stop)
+
+    def source_view(self, source: str) -> "ChunkStore":
+        a, b = self.manifest["sources"].get(source, [0, 0])
+        a, b = max(a, self.start), min(b, self.stop)
+        return ChunkStore(None, _parent=self, _start=a, _stop=max(a, b))
+
+    def partition_by_source(self) -> Tuple["ChunkStore", "ChunkStore", "ChunkStore"]:
+        return tuple(self.source_view(s) for s in SOURCES)
+
+    # ---- Column / row access ----
+    def column(self, name: str) -> np.ndarray:
+        """Typed metadata column for this view (a memmap slice, no copy)."""
+        if name in self._cols:
+            return self._cols[name][self.start:self.stop]
+        raise KeyError(f"not a typed column: {name} (have {sorted(self._cols)})")
+
+    def text(self, i: int) -> str:
+        return self._blobs["text"].get(self.start + i)
+
+    def id(self, i: int) -> str:
+        return self._blobs["id"].get(self.start + i)
+
+    def meta(self, i: int) -> Dict[str, Any]:
+        return json.loads(self._blobs["meta"].get(self.start + i))
+
+    def source(self, i: int) -> str:
+        return SOURCES[int(self._cols["source"][self.start + i])]
+
+    def row(self, i: int, columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """A chunks.jsonl-shaped dict; `columns` restricts which fields get decoded."""
+        cols = columns or ("id", "source", "text", "meta")
+        out: Dict[str, Any] = {}
+        for c in cols:
+            if c in ("text", "id", "meta", "source"):
+                out[c] = getattr(self, c)(i)
+            else:
+                out[c] = self.column(c)[i].item()
+        return out
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.row(i)
+
+    def iter_rows(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.row(i, columns)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_rows()
+
+    def where(self, mask: np.ndarray) -> Iterator[int]:
+        """Row positions (relative to this view) where a boolean column expression holds."""
+        return (int(i) for i in np.flatnonzero(mask))
+
+
+def write_chunk_store(rows: Iterable[Dict[str, Any]], path: str) -> int:
+    with ChunkStoreWriter(path) as w:
+        for r in rows:
+            w.add(r)
+    return w.n
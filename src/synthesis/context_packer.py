@@ -0,0 +1,143 @@
+# src/synthesis/context_packer.py
+"""
+Token-budgeted context packing for --answer.
+
+Replaces TopK + a per-node character cut. Candidates are taken best-score-first and
+their LLM-visible text (metadata header included) is counted with the tokenizer of
+the configured OpenAI model. A node that does not fit the remaining budget is cut
+to the tokens left (if at least `min_tokens`) or skipped so a smaller one can still
+fit. When two adjacent windows of one file are both packed, their shared overlap is
+sent once. The QA template and the query are charged up front, so the packed prompt
+never exceeds `budget_tokens`. Pass the synthesizer's own text_qa_template (already
+selected for the LLM): for a chat model that is a system + user message pair, and
+every message is charged with OpenAI's per-message framing.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.prompts.default_prompts import DEFAULT_TEXT_QA_PROMPT_TMPL
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from src.rerank.sibling_collapse import overlap_len, sibling_key
+from src.telemetry.stats import record
+
+# OpenAI chat framing: each message costs its content plus ~4 tokens, and the reply is primed with ~3
+MSG_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+
+class TokenCounter:
+    def __init__(self, model: str):
+        self.model = model
+        self._enc = None
+        try:
+            import tiktoken
+            try:
+                self._enc = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._enc = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # tiktoken missing, or its BPE file cannot be fetched
+            print(f"[WARN] no tokenizer for {model} ({type(e).__name__}); packing with a byte-based estimate")
+
+    @property
+    def exact(self) -> bool:
+        return self._enc is not None
+
+    def count(self, text: str) -> int:
+        if self._enc is not None:
+            return len(self._enc.encode(text, disallowed_special=()))
+        # BPE averages ~4 bytes/token on English; 3 keeps the estimate on the safe side
+        return -(-len(text.encode("utf-8")) // 3)
+
+    def truncate(self, text: str, n: int) -> str:
+        if n <= 0:
+            return ""
+        if self._enc is not None:
+            return self._enc.decode(self._enc.encode(text, disallowed_special=())[:n])
+        return text.encode("utf-8")[:n * 3].decode("utf-8", "ignore")
+
+
+@lru_cache(maxsize=8)
+def get_counter(model: str) -> TokenCounter:
+    return TokenCounter(model)
+
+
+class ContextPacker(BaseNodePostprocessor):
+    model: str = "gpt-4o-mini"
+    budget_tokens: int = 3000
+    max_nodes: Optional[int] = None
+    min_tokens: int = 48
+    max_overlap: int = 100
+    qa_template: Any = DEFAULT_TEXT_QA_PROMPT_TMPL  # str, or a llama_index prompt template (chat or text)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def _prompt_tokens(self, counter: TokenCounter, query: str) -> int:
+        """Tokens of the QA prompt with an empty context."""
+        if isinstance(self.qa_template, str):
+            return counter.count(self.qa_template.format(context_str="", query_str=query))
+        msgs = self.qa_template.format_messages(context_str="", query_str=query)
+        return sum(counter.count(m.content or "") + MSG_OVERHEAD_TOKENS for m in msgs) + REPLY_PRIMING_TOKENS
+
+    def _fit(self, counter: TokenCounter, node, text: str, room: int) -> Optional[int]:
+        """Cut node's text until its LLM content fits `room` tokens; returns the cost or None."""
+        header = counter.count(node.get_content(metadata_mode=MetadataMode.LLM)) - counter.count(text)
+        keep = room - header
+        while keep >= self.min_tokens:
+            node.set_content(counter.truncate(text, keep))
+            cost = counter.count(node.get_content(metadata_mode=MetadataMode.LLM))
+            if cost <= room:
+                return cost
+            keep -= cost - room  # decode/encode is not always length-stable at the cut
+        return None
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        counter = get_counter(self.model)
+        query = query_bundle.query_str if query_bundle is not None else ""
+        remaining = self.budget_tokens - self._prompt_tokens(counter, query)
+        sep = counter.count("\n\n")  # compact mode joins chunks with a blank line
+
+        packed: List[NodeWithScore] = []
+        windows: Dict[tuple, List[str]] = {}
+        truncated = overlap_dropped = 0
+        for n in sorted(nodes, key=lambda x: x.score or 0.0, reverse=True):
+            if self.max_nodes is not None and len(packed) >= self.max_nodes:
+                break
+            text = n.node.get_content()
+            head = tail = 0
+            w = sibling_key(n.node.metadata or {})
+            if w is not None:
+                toks = text.split()
+                prev, nxt = windows.get(w[:3] + (w[3] - 1,)), windows.get(w[:3] + (w[3] + 1,))
+                head = overlap_len(prev, toks, self.max_overlap) if prev else 0
+                tail = overlap_len(toks[head:], nxt, self.max_overlap) if nxt else 0
+                if head or tail:
+                    toks = toks[head:len(toks) - tail]
+                    if not toks:
+                        continue
+                    text = " ".join(toks)
+
+            node = n.node.model_copy()
+            node.set_content(text)
+            room = remaining - (sep if packed else 0)
+            cost = counter.count(node.get_content(metadata_mode=MetadataMode.LLM))
+            if cost > room:
+                cost = self._fit(counter, node, text, room)
+                if cost is None:
+                    continue
+                truncated += 1
+            remaining = room - cost
+            overlap_dropped += head + tail
+            packed.append(NodeWithScore(node=node, score=n.score))
+            if w is not None:
+                windows[w] = node.get_content().split()
+
+        record(context_tokens=self.budget_tokens - remaining, context_nodes=len(packed),
+               context_truncated=truncated, context_overlap_tokens_dropped=overlap_dropped,
+               context_exact_tokens=counter.exact)
+        return packed
@@ -0,0 +1,217 @@
+# src/telemetry/memory.py
+"""
+Per-stage memory accounting (--mem-profile) and memory budgets.
+
+mem_stage(name) wraps one pipeline stage (chunking, to_documents, index_build,
+retrieve, rerank, graph_build, ...). With profiling enabled it records per stage name:
+  - peak RSS while the stage ran (a background thread samples /proc/self/statm);
+  - peak Python heap growth over the stage (tracemalloc), and the source lines that
+    allocated the most memory still live after the stage's first call.
+Stages that run many times (one per index batch) aggregate: calls, seconds, max peaks.
+A nested stage folds its peaks into the enclosing one. Peaks are process-wide, so two
+stages running at once (--graph next to synthesis) see each other's allocations.
+Disabled (the default), mem_stage is a nullcontext.
+
+MemoryBudget is checked by the index build after every batch: over the limit it halves
+the index and embedding batch sizes instead of growing until the process is OOM-killed.
+"""
+from __future__ import annotations
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.telemetry.stats import current_stats
+
+MB = 1024 * 1024
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes(pid: Optional[int] = None) -> int:
+    """Current resident set size of this process or `pid` (0 for a pid that is gone; this
+    process falls back to its peak where /proc is missing)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except (OSError, ValueError, IndexError):
+        if pid is not None:
+            return 0
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _RssSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name="mem-sampler", daemon=True)
+        self.interval = interval
+        self.peak = rss_bytes()
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            v = rss_bytes()
+            if v > self.peak:
+                self.peak = v
+
+    def take(self) -> int:
+        return max(self.peak, rss_bytes())
+
+    def reset(self):
+        self.peak = rss_bytes()
+
+    def stop(self):
+        self._halt.set()
+
+
+class MemProfiler:
+    def __init__(self, top: int = 5, interval: float = 0.01):
+        self.top = top
+        self.stages: Dict[str, Dict[str, Any]] = {}  # first-seen order
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._sampler = _RssSampler(interval)
+        self._sampler.start()
+
+    def _stack(self) -> List[List[int]]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+
+    def _top_growth(self, before) -> List[List[Any]]:
+        out = []
+        for st in self._snapshot().compare_to(before, "lineno")[:self.top]:
+            if st.size_diff < 64 * 1024:  # sorted by growth; the rest is noise
+                break
+            fr = st.traceback[0]
+            path = fr.filename
+            try:
+                path = os.path.relpath(path)
+            except ValueError:
+                pass
+            out.append([f"{path}:{fr.lineno}", round(st.size_diff / MB, 2)])
+        return out
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self._stack()
+        if stack:  # keep the parent's peak so far before this stage resets the counters
+            stack[-1][0] = max(stack[-1][0], self._sampler.take())
+            stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+        # Allocation sites are diffed on a stage's first call only: snapshots are slow on big heaps
+        before = self._snapshot() if self.top and name not in self.stages else None
+        self._sampler.reset()
+        tracemalloc.reset_peak()
+        rss0 = rss_bytes()
+        heap0 = tracemalloc.get_traced_memory()[0]
+        frame = [rss0, heap0]  # peak RSS, peak heap (absolute)
+        stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            secs = time.perf_counter() - t0
+            frame[0] = max(frame[0], self._sampler.take())
+            frame[1] = max(frame[1], tracemalloc.get_traced_memory()[1])
+            stack.pop()
+            if stack:
+                stack[-1][0] = max(stack[-1][0], frame[0])
+                stack[-1][1] = max(stack[-1][1], frame[1])
+            peak_rss, heap_up = round(frame[0] / MB, 1), round((frame[1] - heap0) / MB, 1)
+            tops = self._top_growth(before) if before is not None else None
+            with self._lock:
+                st = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "peak_rss_mb": 0.0,
+                                                   "rss_delta_mb": 0.0, "peak_heap_growth_mb": 0.0, "top": []})
+                st["calls"] += 1
+                st["seconds"] += secs
+                st["peak_rss_mb"] = max(st["peak_rss_mb"], peak_rss)
+                st["rss_delta_mb"] = round(st["rss_delta_mb"] + (rss_bytes() - rss0) / MB, 1)
+                st["peak_heap_growth_mb"] = max(st["peak_heap_growth_mb"], heap_up)
+                if tops is not None:
+                    st["top"] = tops
+            qs = current_stats()
+            if qs is not None:
+                qs.setdefault("mem", {})[name] = {"peak_rss_mb": peak_rss, "peak_heap_growth_mb": heap_up}
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {k: dict(v, seconds=round(v["seconds"], 3)) for k, v in self.stages.items()}
+
+    def report(self) -> str:
+        lines = [f"{'stage':<14} {'calls':>5} {'sec':>8} {'peakRSS':>9} {'dRSS':>8} {'heap+':>8}  (MB)"]
+        for name, st in self.as_dict().items():
+            lines.append(f"{name:<14} {st['calls']:>5} {st['seconds']:>8.2f} {st['peak_rss_mb']:>9.1f} "
+                         f"{st['rss_delta_mb']:>8.1f} {st['peak_heap_growth_mb']:>8.1f}")
+        for name, st in self.stages.items():
+            if st["top"]:
+                lines.append(f"\n[{name}] top allocators (MB allocated and still live after its first call)")
+                lines.extend(f"  {mb:>8.2f}  {where}" for where, mb in st["top"])
+        return "\n".join(lines)
+
+    def close(self):
+        self._sampler.stop()
+        tracemalloc.stop()
+
+
+_PROFILER: Optional[MemProfiler] = None
+
+
+def enable_mem_profile(top: int = 5, interval: float = 0.01) -> MemProfiler:
+    global _PROFILER
+    if _PROFILER is None:
+        _PROFILER = MemProfiler(top=top, interval=interval)
+    return _PROFILER
+
+
+def mem_profiler() -> Optional[MemProfiler]:
+    return _PROFILER
+
+
+def mem_stage(name: str):
+    return _PROFILER.stage(name) if _PROFILER is not None else nullcontext()
+
+
+class MemoryBudget:
+    """RSS ceiling for the index build; shrink() halves a batch size (never below min_batch).
+
+    The RSS counted is this process plus every pid passed to watch() (e.g. the shard
+    processes holding the vectors with --shards).
+    """
+
+    def __init__(self, limit_mb: float, min_batch: int = 8):
+        self.limit_mb = limit_mb
+        self.min_batch = min_batch
+        self.shrinks = 0
+        self.pids: List[int] = []
+
+    def watch(self, pids: Iterable[int]):
+        self.pids.extend(p for p in pids if p)
+
+    def rss(self) -> int:
+        return rss_bytes() + sum(rss_bytes(p) for p in self.pids)
+
+    def over(self) -> bool:
+        if self.rss() <= self.limit_mb * MB:
+            return False
+        gc.collect()  # only count what is still reachable (here; the shards' memory is theirs to keep)
+        return self.rss() > self.limit_mb * MB
+
+    def shrink(self, what: str, size: int) -> int:
+        new = max(self.min_batch, size // 2)
+        if new < size:
+            self.shrinks += 1
+            print(f"[MEM] RSS {self.rss() / MB:.0f} MB over budget {self.limit_mb:.0f} MB; {what} {size} -> {new}")
+        return new
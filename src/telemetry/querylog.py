@@ -0,0 +1,158 @@
+# src/telemetry/querylog.py
+"""
+Structured JSONL query log with a background writer.
+
+The query path only does a non-blocking queue put; a daemon thread batches
+records, writes one JSON object per line, fsyncs at most every `fsync_interval`
+seconds, and rotates the file by size (responses.jsonl -> .1 -> .2 ...).
+If the queue is full the record is dropped and counted, never blocking the caller.
+"""
+from __future__ import annotations
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+_STOP = object()
+
+
+class QueryLogger:
+    def __init__(self, path: str, *, max_queue: int = 10000, batch_size: int = 256,
+                 fsync_interval: float = 1.0, max_bytes: int = 50 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self.written = 0
+        self._drop_lock = threading.Lock()  # log() runs on many caller threads
+        self._dirty = False  # written since the last fsync
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+        self._last_fsync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="querylog-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---- Producer side (query path) ----
+    def log(self, record: Dict[str, Any]) -> bool:
+        """Enqueue one record; returns False (and counts a drop) if the queue is full or closed."""
+        if self._closed:
+            self._drop()
+            return False
+        record.setdefault("ts", datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"))
+        try:
+            self._q.put_nowait(record)
+            return True
+        except queue.Full:
+            self._drop()
+            return False
+
+    def _drop(self):
+        with self._drop_lock:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+
+    # ---- Writer thread ----
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                item = self._q.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._maybe_fsync(force=True)
+                continue
+            batch: List[Dict[str, Any]] = []
+            if item is _STOP:
+                stop = True
+            else:
+                batch.append(item)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write_batch(batch)
+            self._maybe_fsync(force=stop)
+        self._f.close()
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        for rec in batch:
+            try:
+                line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+            except Exception as e:
+                print("[querylog] unserializable record:", e)
+                continue
+            size = len(line.encode("utf-8"))  # max_bytes is a byte limit; non-ASCII text is >1 byte/char
+            if self.max_bytes and self._f.tell() + size > self.max_bytes and self._f.tell() > 0:
+                self._rotate()
+            self._f.write(line)
+            self.written += 1
+            self._dirty = True
+        self._f.flush()
+
+    def _maybe_fsync(self, force: bool = False):
+        if not self._dirty:  # an idle interval has nothing to sync
+            return
+        now = time.monotonic()
+        if force or now - self._last_fsync >= self.fsync_interval:
+            try:
+                os.fsync(self._f.fileno())
+            except (OSError, ValueError):
+                pass
+            self._last_fsync = now
+            self._dirty = False
+
+    def _rotate(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._f = open(self.path, "a", encoding="utf-8")
+
+
+def build_query_record(query: str, source_nodes: List[Any], flags: Optional[Dict[str, Any]] = None,
+                       timings: Optional[Dict[str, float]] = None, **extra) -> Dict[str, Any]:
+    """One log row: ids/scores/sources of the returned nodes, run flags and stage timings."""
+    chunks = []
+    for sn in source_nodes or []:
+        m = sn.metadata or {}
+        chunks.append({"source": m.get("source"), "id": m.get("id"), "score": float(sn.score or 0.0)})
+    rec = {
+        "q": query,
+        "sources": sorted({c["source"] for c in chunks if c["source"]}),
+        "topk": len(chunks),
+        "chunks": chunks,
+        "flags": dict(flags or {}),
+    }
+    if timings:
+        rec["timings_ms"] = timings
+    rec.update(extra)
+    return rec
@@ -0,0 +1,38 @@
+# src/telemetry/stats.py
+"""
+Per-query counters that pipeline stages can report into (e.g. rerank pairs saved,
+adaptive k per source). ask() opens a scope and copies the dict into the query log;
+outside a scope record()/incr() are no-ops.
+"""
+from __future__ import annotations
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+_current: contextvars.ContextVar = contextvars.ContextVar("astraml_query_stats", default=None)
+
+
+@contextmanager
+def collect_stats():
+    d: Dict[str, Any] = {}
+    token = _current.set(d)
+    try:
+        yield d
+    finally:
+        _current.reset(token)
+
+
+def current_stats() -> Optional[Dict[str, Any]]:
+    return _current.get()
+
+
+def record(**kv):
+    d = _current.get()
+    if d is not None:
+        d.update(kv)
+
+
+def incr(key: str, n: int = 1):
+    d = _current.get()
+    if d is not None:
+        d[key] = d.get(key, 0) + n
@@ -0,0 +1,186 @@
+# src/telemetry/tracing.py
+"""
+Lightweight span/timer API for the query path.
+
+Usage:
+    with start_trace("query", q=query) as tr:   # tr is None when tracing is off
+        with span("retrieve"):
+            ...
+    tr.to_dict()        # nested timing tree
+    tr.stage_timings()  # flat {"query/retrieve": ms, ...} for the structured log
+
+When no trace is active, span() returns a shared no-op context manager, so the
+instrumented code pays one ContextVar lookup and nothing else.
+"""
+from __future__ import annotations
+import json
+import os
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("astraml_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("astraml_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "children")
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attrs = dict(attrs or {})
+        self.children: List["Span"] = []
+
+    @property
+    def ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {"name": self.name, "ms": round(self.ms, 3)}
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.children:
+            out["children"] = [c.to_dict() for c in self.children]
+        return out
+
+
+class _NoopSpan:
+    """Returned by span() when tracing is disabled; supports the same surface as Span."""
+    def __enter__(self): return None
+    def __exit__(self, *exc): return False
+    def set(self, **attrs): pass
+
+_NOOP = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name: str, **attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.root = Span(name, attrs=attrs)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        parent = _current_span.get() or self.root
+        s = Span(name, parent_id=parent.span_id, attrs=attrs)
+        parent.children.append(s)  # list.append is atomic, safe across worker threads
+        token = _current_span.set(s)
+        try:
+            yield s
+        finally:
+            s.end_ns = time.time_ns()
+            _current_span.reset(token)
+
+    def finish(self):
+        if self.root.end_ns is None:
+            self.root.end_ns = time.time_ns()
+
+    # ---- Views ----
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, **self.root.to_dict()}
+
+    def stage_timings(self) -> Dict[str, float]:
+        """Flatten the tree into {"root/child/...": ms}; repeated names get summed."""
+        out: Dict[str, float] = {}
+
+        def walk(s: Span, prefix: str):
+            path = f"{prefix}/{s.name}" if prefix else s.name
+            out[path] = round(out.get(path, 0.0) + s.ms, 3)
+            for c in s.children:
+                walk(c, path)
+
+        walk(self.root, "")
+        return out
+
+    def format_tree(self) -> str:
+        lines = []
+
+        def walk(s: Span, depth: int):
+            lines.append(f"{'  ' * depth}{s.name:<{max(1, 28 - 2 * depth)}} {s.ms:9.2f} ms")
+            for c in s.children:
+                walk(c, depth + 1)
+
+        walk(self.root, 0)
+        return "\n".join(lines)
+
+    def to_otel(self, service_name: str = "astraml") -> Dict[str, Any]:
+        """OTLP/JSON (ExportTraceServiceRequest) shape, as accepted by the OTel collector file receiver."""
+        spans = []
+
+        def attr(k, v):
+            if isinstance(v, bool):
+                val = {"boolValue": v}
+            elif isinstance(v, int):
+                val = {"intValue": str(v)}
+            elif isinstance(v, float):
+                val = {"doubleValue": v}
+            else:
+                val = {"stringValue": str(v)}
+            return {"key": k, "value": val}
+
+        def walk(s: Span):
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent_id or "",
+                "name": s.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or time.time_ns()),
+                "attributes": [attr(k, v) for k, v in s.attrs.items()],
+            })
+            for c in s.children:
+                walk(c)
+
+        walk(self.root)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attr("service.name", service_name)]},
+                "scopeSpans": [{"scope": {"name": "astraml.tracing"}, "spans": spans}],
+            }]
+        }
+
+
+# ------- Module-level API -------
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def span(name: str, **attrs):
+    """Open a child span under the active trace; a shared no-op when tracing is off."""
+    tr = _current_trace.get()
+    if tr is None:
+        return _NOOP
+    return tr.span(name, **attrs)
+
+@contextmanager
+def start_trace(name: str, enabled: bool = True, **attrs):
+    """Activate a trace for the current context. Yields None when disabled."""
+    if not enabled:
+        yield None
+        return
+    tr = Trace(name, **attrs)
+    t_token = _current_trace.set(tr)
+    s_token = _current_span.set(tr.root)
+    try:
+        yield tr
+    finally:
+        tr.finish()
+        _current_span.reset(s_token)
+        _current_trace.reset(t_token)
+
+def export_otel_json(trace: Trace, path: str):
+    """Append one OTLP/JSON request per line (the collector's file exporter format)."""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(trace.to_otel(), ensure_ascii=False) + "\n")
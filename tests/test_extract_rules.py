@@ -0,0 +1,33 @@
+# test_extract_rules.py  —— regressions for the rule-based claim extractor (false claims become fake conflicts)
+#   python -m pytest -q tests/test_extract_rules.py
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.graphrag.extract_rules import extract_claims_rules
+
+
+def claims(text):
+    return [(c["key"], c["val"]) for c in extract_claims_rules(text)]
+
+
+def test_bare_artifacts_number_is_not_retention():
+    assert claims("artifacts 2024 release") == []
+
+
+def test_scientific_notation_is_not_a_count():
+    assert claims("batch_size: 3e-5") == []
+
+
+def test_range_is_not_a_count():
+    assert claims("retries 5-10 times") == []
+
+
+def test_retention_forms_still_match():
+    assert claims("we keep artifacts for 60 days") == [("param.artifact_retention_days", "60")]
+    assert claims("Why Some Teams Keep 60-Day Artifacts") == [("param.artifact_retention_days", "60")]
+    assert claims("60-day artifact retention") == [("param.artifact_retention_days", "60")]
+    assert claims("artifacts: 30 days") == [("param.artifact_retention_days", "30")]
+    assert claims("batch_size: 32") == [("param.batch_size", "32")]
@@ -0,0 +1,51 @@
+# test_semantic_cache.py  —— a semantic hit reuses the stored candidates and GraphRAG lines; no graph rebuild
+#   python -m pytest -q tests/test_semantic_cache.py
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parents[1]  # project_root
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+import time
+from contextlib import nullcontext
+
+from llama_index.core.base.response.schema import Response
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.settings import Settings
+
+import main
+from src.cache.semantic_cache import SemanticCache
+
+
+class FakeEngine:
+    """Synthesis only; retrieval/rank must never run on a semantic hit."""
+
+    def pin(self):
+        return nullcontext()
+
+    def retrieve(self, qb):
+        raise AssertionError("retrieval ran on a semantic hit")
+
+    def rank(self, qb, nodes):
+        raise AssertionError("rank ran on a semantic hit")
+
+    def run(self, qb, ranked):
+        return None, None, Response(response="ok", source_nodes=ranked), time.perf_counter()
+
+
+def test_semantic_hit_skips_graphrag(monkeypatch, capsys):
+    Settings.embed_model = MockEmbedding(embed_dim=8)  # every query embeds to the same vector
+    calls = []
+    monkeypatch.setattr(main, "run_graphrag_on_nodes", lambda *a, **k: calls.append(a) or ["fresh graph"])
+    flags = {"graph": True, "graph_topn": 5}
+    sc = SemanticCache()
+    key = SemanticCache.params_key()
+    node = NodeWithScore(node=TextNode(text="retries: 3", id_="a", metadata={"source": "docs", "id": "a"}), score=1.0)
+    sc.add(Settings.embed_model.get_query_embedding("x"), key, "what retries policy",
+           {"nodes": main.nodes_to_payload([node]), "graph": ["stored graph line"], "graph_topn": 5})
+
+    resp = main.ask(FakeEngine(), "which retry policy?", graph=True, graph_topn=5, flags=flags, semantic_cache=sc)
+
+    assert calls == []
+    assert "stored graph line" in capsys.readouterr().out
+    assert [n.node.node_id for n in resp.source_nodes] == ["a"]